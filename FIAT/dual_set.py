@@ -15,6 +15,8 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with FIAT. If not, see <http://www.gnu.org/licenses/>.
 
+from itertools import chain
+
 import numpy
 
 
@@ -24,18 +26,25 @@ class DualSet(object):
         self.ref_el = ref_el
         self.entity_ids = entity_ids
 
-        # Compute the nodes on the closure of each sub_entity.
-        self.entity_closure_ids = {}
-        for dim, entities in ref_el.sub_entities.items():
-            self.entity_closure_ids[dim] = {}
-
-            for e, sub_entities in entities.items():
-                ids = []
-
-                for d, se in sub_entities:
-                    ids += self.entity_ids[d][se]
-                ids.sort()
-                self.entity_closure_ids[d][e] = ids
+        # The closure map and the flat array views are only built on
+        # first access, since most elements (and in particular
+        # wrappers and restrictions) never ask for them.
+        self._entity_closure_ids = None
+        self._entity_ids_csr = None
+        self._entity_closure_ids_csr = None
+
+    @property
+    def entity_closure_ids(self):
+        """The nodes on the closure of each sub_entity."""
+        if self._entity_closure_ids is None:
+            entity_ids = self.entity_ids
+            closure_ids = {}
+            for dim, entities in self.ref_el.sub_entities.items():
+                closure_ids[dim] = {e: sorted(chain.from_iterable(entity_ids[d][se]
+                                                                  for d, se in sub_entities))
+                                    for e, sub_entities in entities.items()}
+            self._entity_closure_ids = closure_ids
+        return self._entity_closure_ids
 
     def get_nodes(self):
         return self.nodes
@@ -46,6 +55,24 @@ class DualSet(object):
     def get_entity_ids(self):
         return self.entity_ids
 
+    def get_entity_ids_csr(self):
+        """Return the entity to node map as flat arrays.
+
+        :returns: a dict mapping each entity dimension to a pair
+            ``(offsets, ids)`` of integer arrays, such that the nodes
+            of entity ``e`` are ``ids[offsets[e]:offsets[e + 1]]``.
+        """
+        if self._entity_ids_csr is None:
+            self._entity_ids_csr = _make_csr(self.entity_ids)
+        return self._entity_ids_csr
+
+    def get_entity_closure_ids_csr(self):
+        """Return the entity to closure node map as flat arrays, in
+        the same format as :meth:`get_entity_ids_csr`."""
+        if self._entity_closure_ids_csr is None:
+            self._entity_closure_ids_csr = _make_csr(self.entity_closure_ids)
+        return self._entity_closure_ids_csr
+
     def get_reference_element(self):
         return self.ref_el
 
@@ -64,3 +91,19 @@ class DualSet(object):
             self.mat[i][:] = self.nodes[i].to_riesz(poly_set)
 
         return self.mat
+
+
+def _make_csr(entity_map):
+    """Convert a dict of dicts mapping dimension and entity number to
+    lists of ids into per-dimension ``(offsets, ids)`` array pairs."""
+    result = {}
+    for dim, entities in entity_map.items():
+        lists = [entities[e] for e in sorted(entities)]
+        offsets = numpy.zeros(len(lists) + 1, dtype=numpy.intp)
+        numpy.cumsum([len(ids) for ids in lists], out=offsets[1:])
+        ids = numpy.fromiter(chain.from_iterable(lists), dtype=numpy.intp,
+                             count=offsets[-1])
+        offsets.setflags(write=False)
+        ids.setflags(write=False)
+        result[dim] = (offsets, ids)
+    return result
@@ -19,6 +19,7 @@ from itertools import chain
 
 import numpy
 
+from FIAT import parallel
 from FIAT.finite_element import FiniteElement
 from FIAT.dual_set import DualSet
 from FIAT.mixed import concatenate_entity_dofs
@@ -105,9 +106,10 @@ class EnrichedElement(FiniteElement):
 
         table = {}
         irange = slice(0)
-        for element in self._elements:
+        etables = parallel.parallel_map(lambda e: e.tabulate(order, points, entity),
+                                        self._elements)
+        for element, etable in zip(self._elements, etables):
 
-            etable = element.tabulate(order, points, entity)
             irange = slice(irange.stop, irange.stop + element.space_dimension())
 
             # Insert element table into table
@@ -125,6 +127,9 @@ class EnrichedElement(FiniteElement):
 
         return table
 
+    def _fingerprint_data(self):
+        return super(EnrichedElement, self)._fingerprint_data() + tuple(self._elements)
+
     def value_shape(self):
         """Return the value shape of the finite element functions."""
         result, = set(e.value_shape() for e in self._elements)
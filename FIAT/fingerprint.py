@@ -0,0 +1,92 @@
+# Copyright (C) 2018 Imperial College London and others
+#
+# This file is part of FIAT.
+#
+# FIAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FIAT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with FIAT. If not, see <http://www.gnu.org/licenses/>.
+
+"""Content hashing of FIAT objects.
+
+A fingerprint is a hex digest of a nested structure of plain Python
+data, numpy arrays, reference cells and other fingerprinted objects.
+Unlike :func:`hash` or :func:`repr`, it only depends on the content of
+the data, so it is stable across processes and runs and may be used to
+key on-disk and shared-memory caches.
+"""
+
+import hashlib
+import numbers
+
+import numpy
+
+from FIAT.reference_element import Cell, TensorProductCell
+
+
+def compute_fingerprint(*data):
+    """Return the hex digest of some data.
+
+    :arg data: Any number of ``None``, booleans, numbers, strings,
+        tuples, lists, dicts, numpy arrays, reference cells or objects
+        with a ``fingerprint()`` method, nested arbitrarily.
+    """
+    h = hashlib.sha1()
+    _update(h, data)
+    return h.hexdigest()
+
+
+def _update(h, obj):
+    if obj is None:
+        h.update(b"N")
+    elif isinstance(obj, (bool, numpy.bool_)):
+        h.update(b"b1" if obj else b"b0")
+    elif isinstance(obj, numbers.Integral):
+        h.update(b"i%d;" % int(obj))
+    elif isinstance(obj, numbers.Real):
+        h.update(b"f" + repr(float(obj)).encode() + b";")
+    elif isinstance(obj, str):
+        data = obj.encode()
+        h.update(b"s%d;" % len(data))
+        h.update(data)
+    elif isinstance(obj, (tuple, list)):
+        h.update(b"(%d;" % len(obj))
+        for item in obj:
+            _update(h, item)
+        h.update(b")")
+    elif isinstance(obj, dict):
+        # Order the items by the digest of the keys, since the keys
+        # need not be mutually comparable.
+        items = sorted((compute_fingerprint(k), v) for k, v in obj.items())
+        h.update(b"{%d;" % len(items))
+        for k, v in items:
+            h.update(k.encode())
+            _update(h, v)
+        h.update(b"}")
+    elif isinstance(obj, numpy.ndarray):
+        if obj.dtype.hasobject:
+            _update(h, obj.tolist())
+        else:
+            array = numpy.ascontiguousarray(obj, dtype=obj.dtype.newbyteorder("<"))
+            h.update(b"a" + array.dtype.str.encode())
+            _update(h, array.shape)
+            h.update(array.tobytes())
+    elif isinstance(obj, Cell):
+        h.update(b"c")
+        _update(h, type(obj).__name__)
+        if isinstance(obj, TensorProductCell):
+            _update(h, obj.cells)
+        else:
+            _update(h, obj.get_vertices())
+    elif hasattr(obj, "fingerprint"):
+        h.update(b"F" + obj.fingerprint().encode())
+    else:
+        raise TypeError("Cannot fingerprint object of type %s" % type(obj).__name__)
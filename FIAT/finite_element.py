@@ -21,8 +21,9 @@
 
 import numpy
 
-from FIAT.polynomial_set import PolynomialSet
-from FIAT.quadrature_schemes import create_quadrature
+from FIAT.fingerprint import compute_fingerprint
+from FIAT.polynomial_set import PolynomialSet, mis
+from FIAT.quadrature_schemes import create_entity_quadrature
 
 
 class FiniteElement(object):
@@ -102,6 +103,86 @@ class FiniteElement(object):
         """
         raise NotImplementedError("Must be specified in the element subclass of FiniteElement.")
 
+    def iter_tabulate(self, order, points, chunk=1024, out=None, entity=None):
+        """Tabulate derivatives up to given order of basis functions at
+        given points, a chunk of points at a time, so that the memory
+        used does not grow with the number of points.
+
+        :arg order: The maximum order of derivative.
+        :arg points: An array of points.
+        :arg chunk: The number of points per chunk.
+        :arg out: Optional dict of arrays, with the same keys and
+            shapes as the tables from :meth:`tabulate` except for the
+            last axis, which must have length at least ``chunk``.
+            Each chunk is copied into these, so that the caller can
+            keep the tables in memory of its choosing.
+        :arg entity: Optional (dimension, entity number) pair
+            indicating which topological entity of the reference
+            element to tabulate on.
+        :returns: A generator of ``(slice, tables)`` pairs, where the
+            slice selects the chunk of points and tables is a dict as
+            from :meth:`tabulate` at those points.  With ``out``, the
+            tables are views of its arrays, which are overwritten by
+            the next chunk.
+        """
+        if chunk < 1:
+            raise ValueError("Need a positive chunk size, not %d" % chunk)
+        if out is not None:
+            sd = self.ref_el.get_spatial_dimension()
+            alphas = set(alpha for i in range(order + 1) for alpha in mis(sd, i))
+            if set(out) != alphas:
+                raise ValueError("Output has keys %s, expecting %s"
+                                 % (sorted(out), sorted(alphas)))
+            shape = (self.space_dimension(),) + self.value_shape()
+            for alpha, buf in out.items():
+                if buf.shape[:-1] != shape or buf.shape[-1] < chunk:
+                    raise ValueError("Output for %s has shape %s, expecting %s"
+                                     % (alpha, buf.shape, shape + ("n >= %d" % chunk,)))
+        return self._iter_tabulate(order, numpy.asarray(points), chunk, out, entity)
+
+    def _iter_tabulate(self, order, points, chunk, out, entity):
+        for start in range(0, len(points), chunk):
+            s = slice(start, min(start + chunk, len(points)))
+            table = self.tabulate(order, points[s], entity)
+            if out is not None:
+                views = {}
+                for alpha, t in table.items():
+                    views[alpha] = out[alpha][..., :s.stop - s.start]
+                    views[alpha][...] = t
+                table = views
+            yield s, table
+
+    def tabulate_into(self, order, points, out, tile=16384, entity=None):
+        """Tabulate derivatives up to given order of basis functions
+        at given points into a preallocated array, a tile of points at
+        a time.  With memory-mapped points (``numpy.load(...,
+        mmap_mode="r")``) and output (:func:`numpy.lib.format.open_memmap`),
+        this tabulates point sets larger than memory.
+
+        :arg order: The maximum order of derivative.
+        :arg points: An array of points.
+        :arg out: The output array, of shape ``(nalphas, space_dimension,
+            value_shape, npoints)``, the tables for the derivative
+            multi-indices being stacked in the order returned.
+        :arg tile: The number of points per tile.
+        :arg entity: Optional (dimension, entity number) pair
+            indicating which topological entity of the reference
+            element to tabulate on.
+        :returns: The list of derivative multi-indices.
+        """
+        sd = self.ref_el.get_spatial_dimension()
+        alphas = [alpha for i in range(order + 1) for alpha in mis(sd, i)]
+        shape = (len(alphas), self.space_dimension()) + self.value_shape() + (len(points),)
+        if out.shape != shape:
+            raise ValueError("Output has shape %s, expecting %s" % (out.shape, shape))
+
+        for s, tables in self.iter_tabulate(order, points, chunk=tile, entity=entity):
+            for i, alpha in enumerate(alphas):
+                out[i, ..., s] = tables[alpha]
+        if hasattr(out, "flush"):
+            out.flush()
+        return alphas
+
     @staticmethod
     def is_nodal():
         """True if primal and dual bases are orthogonal. If false,
@@ -111,6 +192,32 @@ class FiniteElement(object):
         """
         return False
 
+    def fingerprint(self):
+        """Return a hex digest identifying the numerical content of the
+        finite element.  It is computed once and is stable across
+        processes and runs, so it can be used to key persistent
+        caches of tables."""
+        try:
+            return self._fingerprint
+        except AttributeError:
+            self._fingerprint = compute_fingerprint(*self._fingerprint_data())
+            return self._fingerprint
+
+    def _fingerprint_data(self):
+        """Return the data which the fingerprint is computed from.
+        Subclasses extend this with the arrays or sub-elements which
+        define their basis functions."""
+        degree = getattr(self, "degree", None)
+        return (type(self).__name__,
+                self.get_reference_element(),
+                degree() if degree else None,
+                getattr(self, "variant", None),
+                self.get_order(),
+                self.get_formdegree(),
+                self.mapping(),
+                self.value_shape(),
+                self.entity_dofs())
+
 
 class CiarletElement(FiniteElement):
     """Class implementing Ciarlet's abstraction of a finite element
@@ -209,6 +316,13 @@ class CiarletElement(FiniteElement):
         """
         return True
 
+    def _fingerprint_data(self):
+        poly_set = self.get_nodal_basis()
+        return super(CiarletElement, self)._fingerprint_data() + \
+            (type(poly_set.get_expansion_set()).__name__,
+             poly_set.get_embedded_degree(),
+             poly_set.get_coeffs())
+
 
 def entity_support_dofs(elem, entity_dim):
     """Return the map of entity id to the degrees of freedom for which the
@@ -228,28 +342,53 @@ def entity_support_dofs(elem, entity_dim):
     ref_el = elem.get_reference_element()
     dim = ref_el.get_spatial_dimension()
 
-    entity_cell = ref_el.construct_subelement(entity_dim)
-    quad = create_quadrature(entity_cell, max(2*elem.degree(), 1))
-    weights = quad.get_weights()
+    quad = create_entity_quadrature(ref_el, entity_dim, max(2*elem.degree(), 1))
+    weights = quad.reference_rule.get_weights()
+    nentities, npoints = quad.weights.shape
 
     eps = 1.e-8  # Is this a safe value?
 
+    # Tabulate on all entities at once
+    points = quad.points.reshape(nentities * npoints, dim)
+    vals = numpy.double(elem.tabulate(0, points)[(0,) * dim])
+    # Square of the basis functions, summed over value components.
+    squares = (vals**2).reshape(len(vals), -1, nentities, npoints).sum(axis=1)
+    # Ints contains the square of the basis functions
+    # integrated over each entity.
+    ints = numpy.dot(squares, weights)
+
     result = {}
     for f in elem.entity_dofs()[entity_dim].keys():
-        entity_transform = ref_el.get_entity_transform(entity_dim, f)
-        points = list(map(entity_transform, quad.get_points()))
-
-        # Integrate the square of the basis functions on the facet.
-        vals = numpy.double(elem.tabulate(0, points)[(0,) * dim])
-        # Ints contains the square of the basis functions
-        # integrated over the facet.
-        if elem.value_shape():
-            # Vector-valued functions.
-            ints = numpy.dot(numpy.einsum("...ij,...ij->...j", vals, vals), weights)
-        else:
-            ints = numpy.dot(vals**2, weights)
-
-        result[f] = [dof for dof, i in enumerate(ints) if i > eps]
+        result[f] = [dof for dof, i in enumerate(ints[:, f]) if i > eps]
 
     cache[entity_dim] = result
     return result
+
+
+def collocation_mass_diagonal(elem, quad):
+    """Return the diagonal of the mass matrix of a scalar element
+    assembled with a quadrature rule, if the element is collocated at
+    the quadrature points, i.e. each basis function is one at exactly
+    one quadrature point and zero at all others.  The mass matrix is
+    then diagonal, and may be inverted pointwise.  This is the case
+    for Gauss-Lobatto-Legendre elements and their tensor products
+    with the matching "GLL" quadrature.
+
+    :arg elem: FIAT finite element
+    :arg quad: FIAT quadrature rule
+    :returns: An array of the diagonal entries in the basis function
+        order, or None if the element is not collocated.
+    """
+    weights = quad.get_weights()
+    if elem.value_shape() or elem.space_dimension() != len(weights):
+        return None
+
+    dim = elem.get_reference_element().get_spatial_dimension()
+    vals = elem.tabulate(0, quad.get_points())[(0,) * dim]
+    # The quadrature point of each basis function
+    perm = numpy.argmax(numpy.abs(vals), axis=1)
+    collocated = numpy.zeros_like(vals)
+    collocated[numpy.arange(len(perm)), perm] = 1
+    if len(set(perm)) != len(perm) or not numpy.allclose(vals, collocated, atol=1.e-10):
+        return None
+    return weights[perm]
@@ -28,7 +28,7 @@ class GaussLegendreDualSet(dual_set.DualSet):
         entity_ids = {0: {0: [], 1: []},
                       1: {0: list(range(0, degree+1))}}
         lr = quadrature.GaussLegendreQuadratureLineRule(ref_el, degree+1)
-        nodes = [functional.PointEvaluation(ref_el, x) for x in lr.pts]
+        nodes = [functional.PointEvaluation(ref_el, tuple(x)) for x in lr.pts]
 
         super(GaussLegendreDualSet, self).__init__(nodes, ref_el, entity_ids)
 
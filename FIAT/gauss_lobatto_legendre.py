@@ -28,7 +28,7 @@ class GaussLobattoLegendreDualSet(dual_set.DualSet):
         entity_ids = {0: {0: [0], 1: [degree]},
                       1: {0: list(range(1, degree))}}
         lr = quadrature.GaussLobattoLegendreQuadratureLineRule(ref_el, degree+1)
-        nodes = [functional.PointEvaluation(ref_el, x) for x in lr.pts]
+        nodes = [functional.PointEvaluation(ref_el, tuple(x)) for x in lr.pts]
 
         super(GaussLobattoLegendreDualSet, self).__init__(nodes, ref_el, entity_ids)
 
@@ -275,6 +275,9 @@ class HDivTrace(FiniteElement):
     def is_nodal():
         return True
 
+    def _fingerprint_data(self):
+        return super(HDivTrace, self)._fingerprint_data() + (self.dg_elements,)
+
 
 def construct_dg_element(ref_el, degree):
     """Constructs a discontinuous galerkin element of a given degree
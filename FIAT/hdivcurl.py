@@ -15,15 +15,104 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with FIAT. If not, see <http://www.gnu.org/licenses/>.
 
+import copy
 import numpy
 import types
 from FIAT.tensor_product import TensorProductElement
 from FIAT import functional
 
 
+class ComponentTable(object):
+    """Table of a vector-valued element of which only some components
+    are non-zero, each being a signed component of a smaller table.
+
+    The dense table has ``dense[:, components[i], :] = signs[i] *
+    block[:, source[i], :]`` and zeros elsewhere.
+
+    :arg block: The table of non-zero values, of shape ``(nbf, npoints)``
+        (for a single component) or ``(nbf, n, npoints)``.
+    :arg components: The components of the dense table which are non-zero.
+    :arg source: The components of the block they are taken from.
+    :arg signs: The signs they are multiplied by.
+    :arg value_size: The number of components of the dense table.
+    """
+
+    def __init__(self, block, components, source, signs, value_size):
+        block = numpy.asarray(block)
+        if block.ndim == 2:
+            block = block[:, numpy.newaxis, :]
+        self.block = block
+        self.components = tuple(components)
+        self.source = tuple(source)
+        self.signs = tuple(signs)
+        self.shape = (block.shape[0], value_size, block.shape[2])
+
+    def __array__(self, dtype=None):
+        return self.to_array() if dtype is None else self.to_array().astype(dtype)
+
+    def to_array(self):
+        """Return the dense table, as from ``tabulate``."""
+        result = numpy.zeros(self.shape, dtype=self.block.dtype)
+        for c, s, sign in zip(self.components, self.source, self.signs):
+            if sign < 0:
+                numpy.negative(self.block[:, s, :], out=result[:, c, :])
+            else:
+                result[:, c, :] = self.block[:, s, :]
+        return result
+
+
+def _copy_element(element):
+    """Return a shallow copy of a TensorProductElement which shares the
+    sub-elements, entity dofs and nodes of the original one, but has a
+    dual set of its own, so that the copy can be modified."""
+    if hasattr(element, "_oldmapping"):
+        # Already wrapped, so start from the bare product again
+        return TensorProductElement(*element.factors)
+    newelement = copy.copy(element)
+    newelement.dual = copy.copy(element.dual)
+    newelement.__dict__.pop("_entity_support_dofs", None)
+    newelement.__dict__.pop("_fingerprint", None)
+    return newelement
+
+
+def _tabulate_components(self, order, points, entity=None):
+    """Return tabulated values of derivatives up to given order of
+    basis functions at given points, as :class:`ComponentTable`
+    objects which only store the non-zero components.
+
+    This is bound to the elements returned by :func:`Hdiv` and
+    :func:`Hcurl`, which supply the components and signs as
+    ``_value_components``."""
+
+    # don't duplicate what the old function does fine...
+    old_result = self.old_tabulate(order, points, entity)
+    sd = self.get_reference_element().get_spatial_dimension()
+    components, source, signs = self._value_components()
+    return {alpha: ComponentTable(table, components, source, signs, sd)
+            for alpha, table in old_result.items()}
+
+
+def _tabulate(self, order, points, entity=None):
+    """Return tabulated values of derivatives up to given order of
+    basis functions at given points."""
+    return {alpha: table.to_array()
+            for alpha, table in self.tabulate_components(order, points, entity).items()}
+
+
 def Hdiv(element):
+    """Return a copy of a tensor product element whose values are
+    embedded in vectors, so that it is H(div) conforming.
+
+    :arg element: A :class:`~FIAT.tensor_product.TensorProductElement`
+        of exactly two factors; products of more factors, such as
+        ``TensorProductElement(A, B, C)``, are not supported, so
+        hexahedral elements must be built as the product of a
+        quadrilateral and an interval element.
+    """
     if not isinstance(element, TensorProductElement):
         raise NotImplementedError
+    if len(element.factors) != 2:
+        raise NotImplementedError("Hdiv is only implemented for products of two elements")
 
     if element.A.get_formdegree() is None or element.B.get_formdegree() is None:
         raise ValueError("form degree of sub-element was None (not set during initialisation), Hdiv cannot be done without this information")
@@ -31,7 +120,7 @@ def Hdiv(element):
     if formdegree != element.get_reference_element().get_spatial_dimension() - 1:
         raise ValueError("Tried to use Hdiv on a non-(n-1)-form element")
 
-    newelement = TensorProductElement(element.A, element.B)  # make a copy to return
+    newelement = _copy_element(element)  # make a copy to return
 
     # redefine value_shape()
     def value_shape(self):
@@ -51,82 +140,65 @@ def Hdiv(element):
     # redefine tabulate
     newelement.old_tabulate = newelement.tabulate
 
-    def tabulate(self, order, points, entity=None):
-        """Return tabulated values of derivatives up to given order of
-        basis functions at given points."""
-
-        # don't duplicate what the old function does fine...
-        old_result = self.old_tabulate(order, points, entity)
-        new_result = {}
+    def _value_components(self):
+        """Return the components of the values, and the components
+        and signs of the old values they are taken from."""
         sd = self.get_reference_element().get_spatial_dimension()
-        for alpha in old_result.keys():
-            temp_old = old_result[alpha]
-
-            if self._oldmapping == "affine":
-                temp = numpy.zeros((temp_old.shape[0], sd, temp_old.shape[1]), dtype=temp_old.dtype)
-                # both constituents affine, i.e., they were 0 forms or n-forms.
-                # to sum to n-1, we must have "0-form on an interval" crossed
-                # with something discontinuous.
-                # look for the (continuous) 0-form, and put the value there
-                if self.A.get_formdegree() == 0:
-                    # first element, so (-x, 0, ...)
-                    # Sign flip to ensure that a positive value of the node
-                    # means a vector field having a direction "to the left"
-                    # relative to direction in which the nodes are placed on an
-                    # edge in case of higher-order schemes.
-                    # This is required for unstructured quadrilateral meshes.
-                    temp[:, 0, :] = -temp_old[:, :]
-                elif self.B.get_formdegree() == 0:
-                    # second element, so (..., 0, x)
-                    temp[:, -1, :] = temp_old[:, :]
-                else:
-                    raise Exception("Hdiv affine/affine form degrees broke")
-
-            elif self._oldmapping == "contravariant piola":
-                temp = numpy.zeros((temp_old.shape[0], sd, temp_old.shape[2]), dtype=temp_old.dtype)
-                Asd = self.A.get_reference_element().get_spatial_dimension()
-                # one component is affine, one is contravariant piola
-                # the affine one must be an n-form, hence discontinuous
-                # this component/these components get zeroed out
-                if element.A.mapping()[0] == "contravariant piola":
-                    # first element, so (x1, ..., xn, 0, ...)
-                    temp[:, :Asd, :] = temp_old[:, :, :]
-                elif element.B.mapping()[0] == "contravariant piola":
-                    # second element, so (..., 0, x1, ..., xn)
-                    temp[:, Asd:, :] = temp_old[:, :, :]
-                else:
-                    raise ValueError("Hdiv contravariant piola couldn't find an existing ConPi subelement")
-
-            elif self._oldmapping == "covariant piola":
-                temp = numpy.zeros((temp_old.shape[0], sd, temp_old.shape[2]), dtype=temp_old.dtype)
-                # one component is affine, one is covariant piola
-                # the affine one must be an n-form, hence discontinuous
-                # this component/these components get zeroed out
-                # the remaining part gets perped
-                if element.A.mapping()[0] == "covariant piola":
-                    Asd = self.A.get_reference_element().get_spatial_dimension()
-                    if not Asd == 2:
-                        raise ValueError("Must be 2d shape to automatically convert covariant to contravariant")
-                    temp_perp = numpy.zeros(temp_old.shape, dtype=temp_old.dtype)
-                    # first element, so (x2, -x1, 0, ...)
-                    temp_perp[:, 0, :] = temp_old[:, 1, :]
-                    temp_perp[:, 1, :] = -temp_old[:, 0, :]
-                    temp[:, :Asd, :] = temp_perp[:, :, :]
-                elif element.B.mapping()[0] == "covariant piola":
-                    Bsd = self.B.get_reference_element().get_spatial_dimension()
-                    if not Bsd == 2:
-                        raise ValueError("Must be 2d shape to automatically convert covariant to contravariant")
-                    temp_perp = numpy.zeros(temp_old.shape, dtype=temp_old.dtype)
-                    # second element, so (..., 0, x2, -x1)
-                    temp_perp[:, 0, :] = temp_old[:, 1, :]
-                    temp_perp[:, 1, :] = -temp_old[:, 0, :]
-                    temp[:, Asd:, :] = temp_old[:, :, :]
-                else:
-                    raise ValueError("Hdiv covariant piola couldn't find an existing CovPi subelement")
-            new_result[alpha] = temp
-        return new_result
-
-    newelement.tabulate = types.MethodType(tabulate, newelement)
+        Asd = self.A.get_reference_element().get_spatial_dimension()
+        if self._oldmapping == "affine":
+            # both constituents affine, i.e., they were 0 forms or n-forms.
+            # to sum to n-1, we must have "0-form on an interval" crossed
+            # with something discontinuous.
+            # look for the (continuous) 0-form, and put the value there
+            if self.A.get_formdegree() == 0:
+                # first element, so (-x, 0, ...)
+                # Sign flip to ensure that a positive value of the node
+                # means a vector field having a direction "to the left"
+                # relative to direction in which the nodes are placed on an
+                # edge in case of higher-order schemes.
+                # This is required for unstructured quadrilateral meshes.
+                return (0,), (0,), (-1,)
+            elif self.B.get_formdegree() == 0:
+                # second element, so (..., 0, x)
+                return (sd - 1,), (0,), (1,)
+            else:
+                raise Exception("Hdiv affine/affine form degrees broke")
+
+        elif self._oldmapping == "contravariant piola":
+            # one component is affine, one is contravariant piola
+            # the affine one must be an n-form, hence discontinuous
+            # this component/these components get zeroed out
+            if self.A.mapping()[0] == "contravariant piola":
+                # first element, so (x1, ..., xn, 0, ...)
+                return tuple(range(Asd)), tuple(range(Asd)), (1,) * Asd
+            elif self.B.mapping()[0] == "contravariant piola":
+                # second element, so (..., 0, x1, ..., xn)
+                return tuple(range(Asd, sd)), tuple(range(sd - Asd)), (1,) * (sd - Asd)
+            else:
+                raise ValueError("Hdiv contravariant piola couldn't find an existing ConPi subelement")
+
+        elif self._oldmapping == "covariant piola":
+            # one component is affine, one is covariant piola
+            # the affine one must be an n-form, hence discontinuous
+            # this component/these components get zeroed out
+            # the remaining part gets perped
+            if self.A.mapping()[0] == "covariant piola":
+                if not Asd == 2:
+                    raise ValueError("Must be 2d shape to automatically convert covariant to contravariant")
+                # first element, so (x2, -x1, 0, ...)
+                return (0, 1), (1, 0), (1, -1)
+            elif self.B.mapping()[0] == "covariant piola":
+                Bsd = self.B.get_reference_element().get_spatial_dimension()
+                if not Bsd == 2:
+                    raise ValueError("Must be 2d shape to automatically convert covariant to contravariant")
+                # second element, so (..., 0, x2, -x1)
+                return (Asd, Asd + 1), (1, 0), (1, -1)
+            else:
+                raise ValueError("Hdiv covariant piola couldn't find an existing CovPi subelement")
+
+    newelement._value_components = types.MethodType(_value_components, newelement)
+    newelement.tabulate_components = types.MethodType(_tabulate_components, newelement)
+    newelement.tabulate = types.MethodType(_tabulate, newelement)
 
     # splat any PointEvaluation functionals.
     # they become a nasty mix of internal and external component DOFs
@@ -144,8 +216,19 @@ def Hdiv(element):
 
 
 def Hcurl(element):
+    """Return a copy of a tensor product element whose values are
+    embedded in vectors, so that it is H(curl) conforming.
+
+    :arg element: A :class:`~FIAT.tensor_product.TensorProductElement`
+        of exactly two factors; products of more factors, such as
+        ``TensorProductElement(A, B, C)``, are not supported, so
+        hexahedral elements must be built as the product of a
+        quadrilateral and an interval element.
+    """
     if not isinstance(element, TensorProductElement):
         raise NotImplementedError
+    if len(element.factors) != 2:
+        raise NotImplementedError("Hcurl is only implemented for products of two elements")
 
     if element.A.get_formdegree() is None or element.B.get_formdegree() is None:
         raise ValueError("form degree of sub-element was None (not set during initialisation), Hcurl cannot be done without this information")
@@ -153,7 +236,7 @@ def Hcurl(element):
     if not (formdegree == 1):
         raise ValueError("Tried to use Hcurl on a non-1-form element")
 
-    newelement = TensorProductElement(element.A, element.B)  # make a copy to return
+    newelement = _copy_element(element)  # make a copy to return
 
     # redefine value_shape()
     def value_shape(self):
@@ -173,82 +256,65 @@ def Hcurl(element):
     # redefine tabulate
     newelement.old_tabulate = newelement.tabulate
 
-    def tabulate(self, order, points, entity=None):
-        """Return tabulated values of derivatives up to given order of
-        basis functions at given points."""
-
-        # don't duplicate what the old function does fine...
-        old_result = self.old_tabulate(order, points, entity)
-        new_result = {}
+    def _value_components(self):
+        """Return the components of the values, and the components
+        and signs of the old values they are taken from."""
         sd = self.get_reference_element().get_spatial_dimension()
-        for alpha in old_result.keys():
-            temp_old = old_result[alpha]
-
-            if self._oldmapping == "affine":
-                temp = numpy.zeros((temp_old.shape[0], sd, temp_old.shape[1]), dtype=temp_old.dtype)
-                # both constituents affine, i.e., they were 0 forms or n-forms.
-                # to sum to 1, we must have "1-form on an interval" crossed with
-                # a bunch of 0-forms (continuous).
-                # look for the 1-form, and put the value in the other place
-                if self.A.get_formdegree() == 1:
-                    # first element, so (x, 0, ...)
-                    # No sign flip here, nor at the other branch, to ensure that
-                    # a positive value of the node means a vector field having
-                    # the same direction as the direction in which the nodes are
-                    # placed on an edge in case of higher-order schemes.
-                    # This is required for unstructured quadrilateral meshes.
-                    temp[:, 0, :] = temp_old[:, :]
-                elif self.B.get_formdegree() == 1:
-                    # second element, so (..., 0, x)
-                    temp[:, -1, :] = temp_old[:, :]
-                else:
-                    raise Exception("Hcurl affine/affine form degrees broke")
-
-            elif self._oldmapping == "covariant piola":
-                temp = numpy.zeros((temp_old.shape[0], sd, temp_old.shape[2]), dtype=temp_old.dtype)
-                Asd = self.A.get_reference_element().get_spatial_dimension()
-                # one component is affine, one is covariant piola
-                # the affine one must be an 0-form, hence continuous
-                # this component/these components get zeroed out
-                if element.A.mapping()[0] == "covariant piola":
-                    # first element, so (x1, ..., xn, 0, ...)
-                    temp[:, :Asd, :] = temp_old[:, :, :]
-                elif element.B.mapping()[0] == "covariant piola":
-                    # second element, so (..., 0, x1, ..., xn)
-                    temp[:, Asd:, :] = temp_old[:, :, :]
-                else:
-                    raise ValueError("Hdiv contravariant piola couldn't find an existing ConPi subelement")
-
-            elif self._oldmapping == "contravariant piola":
-                temp = numpy.zeros((temp_old.shape[0], sd, temp_old.shape[2]), dtype=temp_old.dtype)
-                # one component is affine, one is contravariant piola
-                # the affine one must be an 0-form, hence continuous
-                # this component/these components get zeroed out
-                # the remaining part gets perped
-                if element.A.mapping()[0] == "contravariant piola":
-                    Asd = self.A.get_reference_element().get_spatial_dimension()
-                    if not Asd == 2:
-                        raise ValueError("Must be 2d shape to automatically convert contravariant to covariant")
-                    temp_perp = numpy.zeros(temp_old.shape, dtype=temp_old.dtype)
-                    # first element, so (-x2, x1, 0, ...)
-                    temp_perp[:, 0, :] = -temp_old[:, 1, :]
-                    temp_perp[:, 1, :] = temp_old[:, 0, :]
-                    temp[:, :Asd, :] = temp_perp[:, :, :]
-                elif element.B.mapping()[0] == "contravariant piola":
-                    Bsd = self.B.get_reference_element().get_spatial_dimension()
-                    if not Bsd == 2:
-                        raise ValueError("Must be 2d shape to automatically convert contravariant to covariant")
-                    temp_perp = numpy.zeros(temp_old.shape, dtype=temp_old.dtype)
-                    # second element, so (..., 0, -x2, x1)
-                    temp_perp[:, 0, :] = -temp_old[:, 1, :]
-                    temp_perp[:, 1, :] = temp_old[:, 0, :]
-                    temp[:, Asd:, :] = temp_old[:, :, :]
-                else:
-                    raise ValueError("Hcurl contravariant piola couldn't find an existing CovPi subelement")
-            new_result[alpha] = temp
-        return new_result
-
-    newelement.tabulate = types.MethodType(tabulate, newelement)
+        Asd = self.A.get_reference_element().get_spatial_dimension()
+        if self._oldmapping == "affine":
+            # both constituents affine, i.e., they were 0 forms or n-forms.
+            # to sum to 1, we must have "1-form on an interval" crossed with
+            # a bunch of 0-forms (continuous).
+            # look for the 1-form, and put the value in the other place
+            if self.A.get_formdegree() == 1:
+                # first element, so (x, 0, ...)
+                # No sign flip here, nor at the other branch, to ensure that
+                # a positive value of the node means a vector field having
+                # the same direction as the direction in which the nodes are
+                # placed on an edge in case of higher-order schemes.
+                # This is required for unstructured quadrilateral meshes.
+                return (0,), (0,), (1,)
+            elif self.B.get_formdegree() == 1:
+                # second element, so (..., 0, x)
+                return (sd - 1,), (0,), (1,)
+            else:
+                raise Exception("Hcurl affine/affine form degrees broke")
+
+        elif self._oldmapping == "covariant piola":
+            # one component is affine, one is covariant piola
+            # the affine one must be an 0-form, hence continuous
+            # this component/these components get zeroed out
+            if self.A.mapping()[0] == "covariant piola":
+                # first element, so (x1, ..., xn, 0, ...)
+                return tuple(range(Asd)), tuple(range(Asd)), (1,) * Asd
+            elif self.B.mapping()[0] == "covariant piola":
+                # second element, so (..., 0, x1, ..., xn)
+                return tuple(range(Asd, sd)), tuple(range(sd - Asd)), (1,) * (sd - Asd)
+            else:
+                raise ValueError("Hdiv contravariant piola couldn't find an existing ConPi subelement")
+
+        elif self._oldmapping == "contravariant piola":
+            # one component is affine, one is contravariant piola
+            # the affine one must be an 0-form, hence continuous
+            # this component/these components get zeroed out
+            # the remaining part gets perped
+            if self.A.mapping()[0] == "contravariant piola":
+                if not Asd == 2:
+                    raise ValueError("Must be 2d shape to automatically convert contravariant to covariant")
+                # first element, so (-x2, x1, 0, ...)
+                return (0, 1), (1, 0), (-1, 1)
+            elif self.B.mapping()[0] == "contravariant piola":
+                Bsd = self.B.get_reference_element().get_spatial_dimension()
+                if not Bsd == 2:
+                    raise ValueError("Must be 2d shape to automatically convert contravariant to covariant")
+                # second element, so (..., 0, -x2, x1)
+                return (Asd, Asd + 1), (1, 0), (-1, 1)
+            else:
+                raise ValueError("Hcurl contravariant piola couldn't find an existing CovPi subelement")
+
+    newelement._value_components = types.MethodType(_value_components, newelement)
+    newelement.tabulate_components = types.MethodType(_tabulate_components, newelement)
+    newelement.tabulate = types.MethodType(_tabulate, newelement)
 
     # splat any PointEvaluation functionals.
     # they become a nasty mix of internal and external component DOFs
@@ -22,6 +22,7 @@ import numpy
 from operator import add
 from functools import partial
 
+from FIAT import parallel
 from FIAT.dual_set import DualSet
 from FIAT.finite_element import FiniteElement
 
@@ -69,9 +70,37 @@ class MixedElement(FiniteElement):
     def get_nodal_basis(self):
         raise NotImplementedError("get_nodal_basis not implemented")
 
+    def _distinct_elements(self):
+        """Return a list of (element, indices) pairs, with one pair
+        for each distinct sub-element and the positions at which it
+        occurs.  Sub-elements are the same if they are identical or
+        have the same fingerprint."""
+        try:
+            return self._distinct
+        except AttributeError:
+            pass
+        # Group identical objects first, so that each is fingerprinted
+        # at most once, and not at all if there is only one.
+        identical = {}
+        for i, e in enumerate(self._elements):
+            identical.setdefault(id(e), (e, []))[1].append(i)
+        groups = {}
+        for key, (e, indices) in identical.items():
+            if len(identical) > 1:
+                try:
+                    key = e.fingerprint()
+                except (TypeError, NotImplementedError):
+                    pass
+            groups.setdefault(key, (e, []))[1].extend(indices)
+        self._distinct = sorted(((e, sorted(indices)) for e, indices in groups.values()),
+                                key=lambda g: g[1][0])
+        return self._distinct
+
     def tabulate(self, order, points, entity=None):
         """Tabulate a mixed element by appropriately splatting
         together the tabulation of the individual elements.
+
+        Repeated sub-elements are only tabulated once.
         """
         shape = (self.space_dimension(),) + self.value_shape() + (len(points),)
 
@@ -83,8 +112,17 @@ class MixedElement(FiniteElement):
         irange = numpy.cumsum(sub_dims)
         crange = numpy.cumsum(sub_cmps)
 
-        for i, e in enumerate(self.elements()):
-            table = e.tabulate(order, points, entity)
+        distinct = self._distinct_elements()
+        tables = parallel.parallel_map(lambda group: group[0].tabulate(order, points, entity),
+                                       distinct)
+        for (e, indices), table in zip(distinct, tables):
+            # Row and column indices of the diagonal blocks of all
+            # occurrences of the element, so that they are all filled
+            # by a single assignment.
+            rows = irange[indices][:, numpy.newaxis, numpy.newaxis] + \
+                numpy.arange(sub_dims[indices[0] + 1])[:, numpy.newaxis]
+            cols = crange[indices][:, numpy.newaxis, numpy.newaxis] + \
+                numpy.arange(sub_cmps[indices[0] + 1])
 
             for d, tab in table.items():
                 try:
@@ -93,10 +131,7 @@ class MixedElement(FiniteElement):
                     arr = numpy.zeros(shape, dtype=tab.dtype)
                     output[d] = arr
 
-                ir = irange[i:i+2]
-                cr = crange[i:i+2]
-                tab = tab.reshape(ir[1] - ir[0], cr[1] - cr[0], -1)
-                arr[slice(*ir), slice(*cr)] = tab
+                arr[rows, cols] = tab.reshape(rows.shape[1], cols.shape[2], -1)
 
         return output
 
@@ -104,6 +139,9 @@ class MixedElement(FiniteElement):
         """True if primal and dual bases are orthogonal."""
         return all(e.is_nodal() for e in self._elements)
 
+    def _fingerprint_data(self):
+        return super(MixedElement, self)._fingerprint_data() + self._elements
+
 
 def concatenate_entity_dofs(ref_el, elements):
     """Combine the entity_dofs from a list of elements into a combined
@@ -69,12 +69,6 @@ class NodalEnrichedElement(CiarletElement):
         # Merge polynomial sets
         coeffs = _merge_coeffs([e.get_coeffs() for e in elements])
         dmats = _merge_dmats([e.dmats() for e in elements])
-        poly_set = PolynomialSet(ref_el,
-                                 degree,
-                                 embedded_degree,
-                                 expansion_set,
-                                 coeffs,
-                                 dmats)
 
         # Renumber dof numbers
         offsets = np.cumsum([0] + [e.space_dimension() for e in elements[:-1]])
@@ -85,10 +79,109 @@ class NodalEnrichedElement(CiarletElement):
         nodes = [node for e in elements for node in e.dual_basis()]
         dual_set = DualSet(nodes, ref_el, entity_ids)
 
-        # CiarletElement constructor adjusts poly_set coefficients s.t.
-        # dual_set is really dual to poly_set
-        super(NodalEnrichedElement, self).__init__(poly_set, dual_set, order,
-                                                   formdegree=formdegree, mapping=mapping)
+        # Adjust the merged coefficients s.t. dual_set is really dual
+        # to poly_set.  Unlike the CiarletElement constructor, this
+        # reuses the nodality of the sub-elements and only evaluates
+        # the coupling between them.
+        V, new_coeffs = _reorthogonalize(elements, coeffs)
+        self.V = V
+        self.poly_set = PolynomialSet(ref_el,
+                                      degree,
+                                      embedded_degree,
+                                      expansion_set,
+                                      new_coeffs,
+                                      dmats)
+
+        # Skip the CiarletElement constructor, the nodal basis is
+        # already built
+        super(CiarletElement, self).__init__(ref_el, dual_set, order,
+                                             formdegree=formdegree, mapping=mapping)
+
+
+def _reorthogonalize(elements, coeffs):
+    """Return the generalized Vandermonde matrix of the direct sum of
+    nodal elements together with the nodal basis coefficients.
+
+    As the elements are nodal, the Vandermonde matrix has identity
+    diagonal blocks, V = [[I, V_12, ...], [V_21, I, ...], ...], where
+    V_ij is the dual basis of element i applied to the basis of
+    element j.  Only these coupling blocks are computed, and V is
+    inverted by eliminating the block of the largest element, so that
+    the cost is governed by the remaining (typically small) elements.
+    """
+    dims = [e.space_dimension() for e in elements]
+    offsets = np.cumsum([0] + dims)
+    blocks = [np.arange(offsets[i], offsets[i+1]) for i in range(len(elements))]
+
+    V = np.eye(offsets[-1], dtype=coeffs.dtype)
+    for i, ei in enumerate(elements):
+        for j, ej in enumerate(elements):
+            if i != j:
+                V[np.ix_(blocks[i], blocks[j])] = _apply_dual_basis(ei, ej)
+
+    # Eliminate the largest element p, leaving the Schur complement on
+    # the remaining elements r
+    p = int(np.argmax(dims))
+    rp = blocks[p]
+    rr = np.concatenate([blocks[i] for i in range(len(elements)) if i != p])
+
+    # Solve V^T X = B for the new coefficients X, with B the merged
+    # coefficients
+    B = coeffs.reshape(coeffs.shape[0], -1)
+    X = np.empty_like(B)
+    if len(rr):
+        V_pr = V[np.ix_(rp, rr)]
+        V_rp = V[np.ix_(rr, rp)]
+        S = V[np.ix_(rr, rr)] - np.dot(V_rp, V_pr)
+
+        # The elements are not linearly independent iff S is singular
+        sig = np.linalg.svd(S, compute_uv=False)
+        scale = 1.0 + np.linalg.norm(V_rp) * np.linalg.norm(V_pr)
+        if sig.min() <= 1.e-10 * scale:
+            raise np.linalg.LinAlgError("Singular matrix")
+
+        X[rr] = np.linalg.solve(S.T, B[rr] - np.dot(V_pr.T, B[rp]))
+        X[rp] = B[rp] - np.dot(V_rp.T, X[rr])
+    else:
+        X[rp] = B[rp]
+
+    return V, X.reshape(coeffs.shape)
+
+
+def _apply_dual_basis(a, b):
+    """Evaluate the dual basis of element a on the basis functions of
+    element b."""
+    nodes = a.dual_basis()
+    poly_set = b.get_nodal_basis()
+    b_coeffs = poly_set.get_coeffs()
+
+    if any(node.deriv_dict for node in nodes):
+        riesz = np.array([node.to_riesz(poly_set) for node in nodes])
+        riesz = riesz.reshape(riesz.shape[0], -1)
+        return np.dot(riesz, b_coeffs.reshape(b_coeffs.shape[0], -1).T)
+
+    # Functionals without derivatives are weighted sums of point
+    # values, so tabulate b once at all the points they need.
+    value_shape = poly_set.get_shape()
+    ncomp = int(np.prod(value_shape, dtype=int))
+    points = {}
+    rows, cols, weights = [], [], []
+    for i, node in enumerate(nodes):
+        for pt, wc_list in node.get_point_dict().items():
+            j = points.setdefault(pt, len(points))
+            for w, c in wc_list:
+                c = c if isinstance(c, tuple) else (c,)
+                rows.append(i)
+                cols.append(j * ncomp + (np.ravel_multi_index(c, value_shape) if value_shape else 0))
+                weights.append(w)
+
+    W = np.zeros((len(nodes), len(points) * ncomp))
+    np.add.at(W, (rows, cols), weights)
+
+    sd = poly_set.get_reference_element().get_spatial_dimension()
+    vals = poly_set.tabulate(list(points), 0)[(0,) * sd]
+    vals = vals.reshape(vals.shape[0], ncomp, len(points))
+    return np.dot(W, vals.transpose(0, 2, 1).reshape(vals.shape[0], -1).T)
 
 
 def _merge_coeffs(coeffss):
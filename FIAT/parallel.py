@@ -0,0 +1,118 @@
+# Copyright (C) 2018 Imperial College London and others
+#
+# This file is part of FIAT.
+#
+# FIAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FIAT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with FIAT. If not, see <http://www.gnu.org/licenses/>.
+
+"""Thread parallel tabulation.
+
+This is opt-in: by default everything runs serially, as before.  After
+``set_num_threads(n)`` with ``n > 1``, polynomial sets are tabulated
+in chunks of points and the sub-elements of mixed and enriched
+elements are tabulated concurrently, on a process-wide pool of ``n``
+threads.  numpy releases the GIL in the matrix products which
+dominate large tabulations.
+
+The chunks only depend on the chunk size, never on the number of
+threads or on the order in which they finish, so the results are the
+same for any number of threads.  Work submitted from within a worker
+thread runs serially in that thread, so nested parallel calls cannot
+exhaust the pool.  Changing the number of threads waits for running
+parallel calls to finish before replacing the pool.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+__all__ = ['set_num_threads', 'get_num_threads', 'parallel_map', 'chunks']
+
+# Default number of points per chunk, so that a chunk of an expansion
+# set of a few hundred members fits in cache.
+_CHUNK_SIZE = 1024
+
+_num_threads = 1
+_chunk_size = _CHUNK_SIZE
+_executor = None
+# Number of parallel_map calls using the executor
+_active = 0
+_lock = threading.Condition()
+_local = threading.local()
+
+
+def set_num_threads(num_threads, chunk_size=None):
+    """Set the number of threads used for tabulation.
+
+    :arg num_threads: The number of threads; 1 disables threading.
+    :arg chunk_size: Optional number of points per chunk.
+
+    This waits for any parallel calls running on other threads to
+    finish, so it must not be called from within a parallel call.
+    """
+    global _num_threads, _chunk_size, _executor
+    if num_threads < 1:
+        raise ValueError("Need at least one thread, not %d" % num_threads)
+    if chunk_size is not None and chunk_size < 1:
+        raise ValueError("Need a positive chunk size, not %d" % chunk_size)
+    if getattr(_local, "worker", False):
+        raise RuntimeError("Cannot change the number of threads from a worker thread")
+    with _lock:
+        _lock.wait_for(lambda: _active == 0)
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+        _num_threads = int(num_threads)
+        _chunk_size = int(chunk_size or _CHUNK_SIZE)
+
+
+def get_num_threads():
+    """Return the number of threads used for tabulation."""
+    return _num_threads
+
+
+def chunks(npoints):
+    """Return the slices into a set of points which are tabulated
+    separately, or None if threading is disabled.
+
+    :arg npoints: The number of points.
+    """
+    if _num_threads == 1:
+        return None
+    return [slice(i, min(i + _chunk_size, npoints))
+            for i in range(0, npoints, _chunk_size)]
+
+
+def parallel_map(func, items):
+    """Return ``[func(item) for item in items]``, computed on the
+    thread pool if threading is enabled and this is not a worker
+    thread already."""
+    global _executor, _active
+    items = list(items)
+    if _num_threads == 1 or len(items) < 2 or getattr(_local, "worker", False):
+        return [func(item) for item in items]
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_num_threads)
+        executor = _executor
+        _active += 1
+    try:
+        return list(executor.map(lambda item: _run(func, item), items))
+    finally:
+        with _lock:
+            _active -= 1
+            _lock.notify_all()
+
+
+def _run(func, item):
+    _local.worker = True
+    return func(item)
@@ -27,7 +27,7 @@
 # an entire set of polynomials)
 
 import numpy
-from FIAT import expansions
+from FIAT import expansions, parallel
 from FIAT.functional import index_iterator
 
 
@@ -81,15 +81,34 @@ class PolynomialSet(object):
 
     def tabulate(self, pts, jet_order=0):
         """Returns the values of the polynomial set."""
-        result = {}
+        alphas = [alpha for i in range(jet_order + 1)
+                  for alpha in mis(self.ref_el.get_spatial_dimension(), i)]
+        # The serial and chunked paths share the same arithmetic, so
+        # that the result does not depend on the number of threads.
+        matrices = [numpy.dot(self.coeffs,
+                              numpy.transpose(form_matrix_product(self.dmats, alpha)))
+                    for alpha in alphas]
+        point_chunks = parallel.chunks(len(pts))
+        if point_chunks is not None:
+            return self._tabulate_chunked(pts, alphas, matrices, point_chunks)
         base_vals = self.expansion_set.tabulate(self.embedded_degree, pts)
-        for i in range(jet_order + 1):
-            alphas = mis(self.ref_el.get_spatial_dimension(), i)
-            for alpha in alphas:
-                D = form_matrix_product(self.dmats, alpha)
-                result[alpha] = numpy.dot(self.coeffs,
-                                          numpy.dot(numpy.transpose(D),
-                                                    base_vals))
+        return {alpha: numpy.dot(matrix, base_vals)
+                for alpha, matrix in zip(alphas, matrices)}
+
+    def _tabulate_chunked(self, pts, alphas, matrices, point_chunks):
+        """Tabulate the polynomial set one chunk of points at a time,
+        on the threads of :mod:`FIAT.parallel`."""
+        pts = numpy.asarray(pts)
+        result = {alpha: numpy.empty(self.coeffs.shape[:-1] + (len(pts),),
+                                     dtype=numpy.result_type(self.coeffs, pts))
+                  for alpha in alphas}
+
+        def tabulate_chunk(chunk):
+            base_vals = self.expansion_set.tabulate(self.embedded_degree, pts[chunk])
+            for alpha, matrix in zip(alphas, matrices):
+                result[alpha][..., chunk] = numpy.dot(matrix, base_vals)
+
+        parallel.parallel_map(tabulate_chunk, point_chunks)
         return result
 
     def get_expansion_set(self):
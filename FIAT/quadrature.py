@@ -18,33 +18,106 @@
 # Modified by Marie E. Rognes (meg@simula.no), 2012
 # Modified by David A. Ham (david.ham@imperial.ac.uk), 2015
 
-import itertools
-import math
+import collections
+import functools
+import threading
 import numpy
 
-from FIAT import reference_element, expansions, jacobi, orthopoly
+from FIAT import reference_element, expansions, orthopoly
+from FIAT.fingerprint import compute_fingerprint
+
+# Maximum number of rules cached by each memoized function.
+_MAX_RULES = 256
+
+
+def memoize_on_cell(func):
+    """Decorator caching the quadrature rules returned by a function of
+    a reference cell and further hashable arguments, which may be
+    passed by position or by keyword.  Equal cells with the same
+    vertices share rules.  At most ``_MAX_RULES`` rules are kept, the
+    least recently used ones being dropped first."""
+    cache = collections.OrderedDict()
+    lock = threading.Lock()
+
+    @functools.wraps(func)
+    def wrapper(ref_el, *args, **kwargs):
+        key = (ref_el, ref_el.get_vertices()) + args + tuple(sorted(kwargs.items()))
+        with lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        rule = func(ref_el, *args, **kwargs)
+        with lock:
+            rule = cache.setdefault(key, rule)
+            cache.move_to_end(key)
+            while len(cache) > _MAX_RULES:
+                cache.popitem(last=False)
+        return rule
+
+    wrapper.cache_clear = cache.clear
+    return wrapper
 
 
 class QuadratureRule(object):
     """General class that models integration over a reference element
-    as the weighted sum of a function evaluated at a set of points."""
+    as the weighted sum of a function evaluated at a set of points.
+
+    The points and weights are stored as read-only arrays of shape
+    (npoints, dim) and (npoints,), so that rules may be shared."""
 
     def __init__(self, ref_el, pts, wts):
         if len(wts) != len(pts):
             raise ValueError("Have %d weights, but %d points" % (len(wts), len(pts)))
 
         self.ref_el = ref_el
-        self.pts = pts
-        self.wts = wts
+        self.pts = numpy.array(pts, dtype=float)
+        self.wts = numpy.array(wts, dtype=float)
+        self.pts.setflags(write=False)
+        self.wts.setflags(write=False)
 
     def get_points(self):
-        return numpy.array(self.pts)
+        """Return the (read-only) array of points."""
+        return self.pts
 
     def get_weights(self):
-        return numpy.array(self.wts)
-
-    def integrate(self, f):
-        return sum([w * f(x) for (x, w) in zip(self.pts, self.wts)])
+        """Return the (read-only) array of weights."""
+        return self.wts
+
+    def integrate(self, f, vectorized=False):
+        """Integrate a function.
+
+        :arg f: A callable evaluating the integrand at one point, or
+            an array of values of shape (npoints, ...), whose trailing
+            dimensions index a batch of integrands.
+        :arg vectorized: If True, ``f`` is a callable taking the
+            (npoints, dim) array of points and returning such an
+            array of values.
+        :returns: The integral, an array of the batch shape for
+            tabulated or vectorized integrands.
+        """
+        if vectorized:
+            f = f(self.pts)
+        elif callable(f):
+            return sum([w * f(x) for (x, w) in zip(self.pts, self.wts)])
+
+        values = numpy.asarray(f)
+        if values.shape[:1] != self.wts.shape:
+            raise ValueError("Have %d weights, but values of shape %s"
+                             % (len(self.wts), values.shape))
+        return numpy.tensordot(self.wts, values, axes=1)
+
+    def fingerprint(self):
+        """Return a hex digest identifying the cell, points and weights
+        of the rule.  It is computed once and is stable across
+        processes and runs.  Rules of different classes with the same
+        cell, points and weights have the same fingerprint."""
+        try:
+            return self._fingerprint
+        except AttributeError:
+            self._fingerprint = compute_fingerprint(self.ref_el,
+                                                    self.get_points(),
+                                                    self.get_weights())
+            return self._fingerprint
 
 
 class GaussJacobiQuadratureLineRule(QuadratureRule):
@@ -234,7 +307,7 @@ class UFCTetrahedronFaceQuadratureRule(QuadratureRule):
 def make_quadrature(ref_el, m):
     """Returns the collapsed quadrature rule using m points per
     direction on the given reference element. In the tensor product
-    case, m is a tuple."""
+    case, m is a tuple.  Rules are cached."""
 
     if isinstance(m, tuple):
         min_m = min(m)
@@ -244,6 +317,11 @@ def make_quadrature(ref_el, m):
     msg = "Expecting at least one (not %d) quadrature point per direction" % min_m
     assert (min_m > 0), msg
 
+    return _make_quadrature(ref_el, m)
+
+
+@memoize_on_cell
+def _make_quadrature(ref_el, m):
     if ref_el.get_shape() == reference_element.POINT:
         return QuadratureRule(ref_el, [()], [1])
     elif ref_el.get_shape() == reference_element.LINE:
@@ -262,64 +340,131 @@ def make_quadrature(ref_el, m):
         raise ValueError("Unable to make quadrature for cell: %s" % ref_el)
 
 
+class TensorProductQuadratureRule(QuadratureRule):
+    """Quadrature rule on a TensorProductCell which is the product of
+    rules on the factor cells.
+
+    The factor rules are kept in :attr:`factors`, so that tabulation
+    and integration may exploit the product structure.  The points
+    (concatenated coordinates, the last factor varying fastest) and
+    weights (products) of the full rule are only formed on demand.
+    """
+
+    def __init__(self, *factors):
+        self.ref_el = reference_element.TensorProductCell(*[q.ref_el for q in factors])
+        self.factors = tuple(factors)
+        self._pts = None
+        self._wts = None
+
+    @property
+    def pts(self):
+        if self._pts is None:
+            shape = tuple(len(q.wts) for q in self.factors)
+            coords = []
+            for i, q in enumerate(self.factors):
+                q_pts = q.get_points()
+                index_shape = [1] * len(shape)
+                index_shape[i] = shape[i]
+                coords.append(numpy.broadcast_to(q_pts.reshape(index_shape + [q_pts.shape[1]]),
+                                                 shape + q_pts.shape[1:]))
+            pts = numpy.concatenate(coords, axis=-1).reshape(numpy.prod(shape, dtype=int), -1)
+            pts.setflags(write=False)
+            self._pts = pts
+        return self._pts
+
+    @property
+    def wts(self):
+        if self._wts is None:
+            wts = functools.reduce(numpy.multiply.outer,
+                                   [q.get_weights() for q in self.factors]).ravel()
+            wts.setflags(write=False)
+            self._wts = wts
+        return self._wts
+
+
 def make_tensor_product_quadrature(*quad_rules):
     """Returns the quadrature rule for a TensorProduct cell, by combining
     the quadrature rules of the components."""
-    ref_el = reference_element.TensorProductCell(*[q.ref_el
-                                                   for q in quad_rules])
-    # Coordinates are "concatenated", weights are multiplied
-    pts = [list(itertools.chain(*pt_tuple))
-           for pt_tuple in itertools.product(*[q.pts for q in quad_rules])]
-    wts = [numpy.prod(wt_tuple)
-           for wt_tuple in itertools.product(*[q.wts for q in quad_rules])]
-    return QuadratureRule(ref_el, pts, wts)
+    return TensorProductQuadratureRule(*quad_rules)
 
 
 # rule to get Gauss-Jacobi points
 def compute_gauss_jacobi_points(a, b, m):
-    """Computes the m roots of P_{m}^{a,b} on [-1,1] by Newton's method.
-    The initial guesses are the Chebyshev points.  Algorithm
-    implemented in Python from the pseudocode given by Karniadakis and
-    Sherwin"""
-    x = []
-    eps = 1.e-8
-    max_iter = 100
-    for k in range(0, m):
-        r = -math.cos((2.0 * k + 1.0) * math.pi / (2.0 * m))
-        if k > 0:
-            r = 0.5 * (r + x[k - 1])
-        j = 0
-        delta = 2 * eps
-        while j < max_iter:
-            s = 0
-            for i in range(0, k):
-                s = s + 1.0 / (r - x[i])
-            f = jacobi.eval_jacobi(a, b, m, r)
-            fp = jacobi.eval_jacobi_deriv(a, b, m, r)
-            delta = f / (fp - f * s)
-
-            r = r - delta
-
-            if math.fabs(delta) < eps:
-                break
-            else:
-                j = j + 1
-
-        x.append(r)
-    return x
+    """Computes the m roots of P_{m}^{a,b} on [-1,1], in ascending
+    order.  See :func:`compute_gauss_jacobi_rule`."""
+    return compute_gauss_jacobi_rule(a, b, m)[0]
 
 
 def compute_gauss_jacobi_rule(a, b, m):
-    xs = compute_gauss_jacobi_points(a, b, m)
+    """Computes the m-point Gauss-Jacobi rule for the weight
+    (1-x)^a (1+x)^b on [-1,1].
+
+    For up to ``_GOLUB_WELSCH_MAX_POINTS`` points, the initial nodes
+    are the eigenvalues of the symmetric tridiagonal Jacobi matrix
+    (Golub-Welsch).  For more points, they are the asymptotic
+    approximations of Gatteschi and Pittaluga, which avoids the dense
+    eigenvalue problem.  In either case the nodes are polished by
+    Newton's method on all nodes at once, evaluating the orthonormal
+    Jacobi polynomials by their three-term recurrence, and the weights
+    are the reciprocal sums of squares of these polynomials (the
+    Christoffel numbers).  Nothing overflows, so that this is accurate
+    for thousands of points.  Rules are memoized.
+
+    :returns: a pair of read-only arrays of nodes and weights.
+    """
+    return _gauss_jacobi_rule(float(a), float(b), int(m))
+
+
+# Largest number of points for which the initial Gauss-Jacobi nodes
+# are computed from the eigenvalues of the Jacobi matrix.
+_GOLUB_WELSCH_MAX_POINTS = 100
+
+
+@functools.lru_cache(maxsize=None)
+def _gauss_jacobi_rule(a, b, m):
+    alpha, beta = orthopoly.rec_jacobi(m + 1, a, b)
+    if m > _GOLUB_WELSCH_MAX_POINTS:
+        k = numpy.arange(m, 0, -1)
+        theta = (k + 0.5 * a - 0.25) * numpy.pi / (m + 0.5 * (a + b + 1))
+        try:
+            return _polish_gauss_jacobi_nodes(alpha, beta, m, numpy.cos(theta))
+        except ArithmeticError:
+            pass
+    J = numpy.diag(alpha[:m]) + numpy.diag(numpy.sqrt(beta[1:m]), 1)
+    return _polish_gauss_jacobi_nodes(alpha, beta, m, numpy.linalg.eigvalsh(J, "U"))
 
-    a1 = math.pow(2, a + b + 1)
-    a2 = math.gamma(a + m + 1)
-    a3 = math.gamma(b + m + 1)
-    a4 = math.gamma(a + b + m + 1)
-    a5 = math.factorial(m)
-    a6 = a1 * a2 * a3 / a4 / a5
 
-    ws = [a6 / (1.0 - x**2.0) / jacobi.eval_jacobi_deriv(a, b, m, x)**2.0
-          for x in xs]
+def _polish_gauss_jacobi_nodes(alpha, beta, m, xs):
+    """Refine approximate roots of the m:th orthogonal polynomial with
+    recursion coefficients alpha, beta by Newton's method and compute
+    the Gauss weights.
+
+    :raises ArithmeticError: if Newton's method does not converge to m
+        distinct nodes.
+    """
+    sqrt_beta = numpy.sqrt(beta)
+    delta = numpy.inf
+    for i in range(20):
+        # Orthonormal polynomials and their derivatives at the nodes,
+        # and the sums of squares of those of degree less than m.
+        q0, q1 = numpy.zeros_like(xs), numpy.full_like(xs, 1 / sqrt_beta[0])
+        dq0, dq1 = numpy.zeros_like(xs), numpy.zeros_like(xs)
+        qsum = numpy.zeros_like(xs)
+        for j in range(m):
+            qsum += q1**2
+            q0, q1 = q1, ((xs - alpha[j]) * q1 - sqrt_beta[j] * q0) / sqrt_beta[j + 1]
+            dq0, dq1 = dq1, (q0 + (xs - alpha[j]) * dq1 - sqrt_beta[j] * dq0) / sqrt_beta[j + 1]
+        if numpy.max(numpy.abs(delta)) < 1.e-15:
+            break
+        delta = q1 / dq1
+        xs = xs - delta
+    else:
+        raise ArithmeticError("Newton's method did not converge")
+
+    if not (numpy.all(numpy.diff(xs) > 0) and -1 < xs[0] and xs[-1] < 1):
+        raise ArithmeticError("Newton's method did not converge to distinct nodes")
 
+    ws = 1 / qsum
+    xs.setflags(write=False)
+    ws.setflags(write=False)
     return xs, ws
@@ -74,3 +74,6 @@ class QuadratureElement(FiniteElement):
     def is_nodal():
         # No polynomial basis, but still nodal.
         return True
+
+    def _fingerprint_data(self):
+        return super(QuadratureElement, self)._fingerprint_data() + (numpy.asarray(self._points, dtype=float),)
@@ -9,12 +9,32 @@ Scheme options are:
 
   scheme="canonical" (collapsed Gauss scheme)
 
+  scheme="symmetric" (fully symmetric rules on quadrilaterals and
+                      hexahedra, otherwise as "default")
+
+  scheme="GLL" (Gauss-Lobatto-Legendre rules on intervals, and their
+                products on quadrilaterals, hexahedra and other tensor
+                products of intervals)
+
 Background on the schemes:
 
   Keast rules for tetrahedra:
     Keast, P. Moderate-degree tetrahedral quadrature formulas, Computer
     Methods in Applied Mechanics and Engineering 55(3):339-348, 1986.
     http://dx.doi.org/10.1016/0045-7825(86)90059-9
+
+  Witherden-Vincent rules for triangles and tetrahedra (degree 7 to 20,
+  fully symmetric with positive weights):
+    Witherden, F.D. and Vincent, P.E. On the identification of symmetric
+    quadrature rules for finite element methods, Computers & Mathematics
+    with Applications 69(10):1232-1241, 2015.
+    http://dx.doi.org/10.1016/j.camwa.2015.03.017
+
+  Witherden-Vincent rules for quadrilaterals and hexahedra (degree up
+  to 21, fully symmetric with positive weights), from the same paper.
+
+  The rules of Witherden and Vincent are tabulated in the
+  quadrature_data directory, and loaded on demand.
 """
 
 # Copyright (C) 2011 Garth N. Wells
@@ -38,12 +58,18 @@ Background on the schemes:
 # First added:  2011-04-19
 # Last changed: 2011-04-19
 
+import functools
+import os
+
 # NumPy
-from numpy import array, arange, float64
+import numpy
+from numpy import array, arange, float64, loadtxt
 
 # FIAT
-from FIAT.reference_element import QUADRILATERAL, HEXAHEDRON, TENSORPRODUCT, UFCTriangle, UFCTetrahedron
-from FIAT.quadrature import QuadratureRule, make_quadrature, make_tensor_product_quadrature
+from FIAT.reference_element import LINE, TRIANGLE, TETRAHEDRON, QUADRILATERAL, HEXAHEDRON, TENSORPRODUCT, \
+    UFCTriangle, UFCTetrahedron, make_affine_mapping
+from FIAT.quadrature import QuadratureRule, GaussLobattoLegendreQuadratureLineRule, \
+    make_quadrature, make_tensor_product_quadrature, memoize_on_cell
 
 
 def create_quadrature(ref_el, degree, scheme="default"):
@@ -52,9 +78,17 @@ def create_quadrature(ref_el, degree, scheme="default"):
     that will integrate an polynomial of order 'degree' exactly.
 
     For low-degree (<=6) polynomials on triangles and tetrahedra, this
-    uses hard-coded rules, otherwise it falls back to a collapsed
-    Gauss scheme on simplices.  On tensor-product cells, it is a
-    tensor-product quadrature rule of the subcells.
+    uses hard-coded rules, up to degree 20 tabulated symmetric rules,
+    otherwise it falls back to a collapsed Gauss scheme on simplices.
+    The rules are given on the UFC simplices, and mapped affinely to
+    other triangles and tetrahedra.  On tensor-product cells, it is a tensor-product quadrature rule of
+    the subcells.  With scheme="symmetric", quadrilaterals and
+    hexahedra use tabulated symmetric rules up to degree 21, which
+    need fewer points but have no tensor-product structure.  With
+    scheme="GLL", intervals and their products use (products of)
+    Gauss-Lobatto-Legendre rules, which include the end points.
+
+    Rules are cached, and must not be modified.
 
     :arg cell: The FIAT cell to create the quadrature for.
     :arg degree: The degree of polynomial that the rule should
@@ -67,31 +101,128 @@ def create_quadrature(ref_el, degree, scheme="default"):
             degree = (degree,) * len(ref_el.cells)
 
         assert len(ref_el.cells) == len(degree)
+    return _create_quadrature(ref_el, degree, scheme)
+
+
+@memoize_on_cell
+def _create_quadrature(ref_el, degree, scheme):
+    if ref_el.get_shape() == TENSORPRODUCT:
         quad_rules = [create_quadrature(c, d, scheme)
                       for c, d in zip(ref_el.cells, degree)]
         return make_tensor_product_quadrature(*quad_rules)
 
     if ref_el.get_shape() in [QUADRILATERAL, HEXAHEDRON]:
+        if scheme == "symmetric":
+            name = "quadrilateral" if ref_el.get_shape() == QUADRILATERAL else "hexahedron"
+            rule = _tabulated_scheme(ref_el.product, name,
+                                     max(degree) if isinstance(degree, tuple) else degree)
+            if rule is not None:
+                return rule
+            scheme = "default"
         return create_quadrature(ref_el.product, degree, scheme)
 
     if degree < 0:
         raise ValueError("Need positive degree, not %d" % degree)
 
-    if scheme == "default":
-        # TODO: Point transformation to support good schemes on
-        # non-UFC reference elements.
-        if isinstance(ref_el, UFCTriangle):
-            return _triangle_scheme(degree)
-        elif isinstance(ref_el, UFCTetrahedron):
-            return _tetrahedron_scheme(degree)
+    if scheme in ["default", "symmetric"]:
+        if ref_el.get_shape() == TRIANGLE:
+            return _map_scheme(_triangle_scheme(degree), ref_el)
+        elif ref_el.get_shape() == TETRAHEDRON:
+            return _map_scheme(_tetrahedron_scheme(degree), ref_el)
         else:
             return _fiat_scheme(ref_el, degree)
     elif scheme == "canonical":
         return _fiat_scheme(ref_el, degree)
+    elif scheme == "GLL":
+        if ref_el.get_shape() != LINE:
+            raise ValueError("Gauss-Lobatto-Legendre quadrature is only available "
+                             "on intervals and their tensor products")
+        # m points integrate polynomials of degree 2m - 3 exactly
+        return GaussLobattoLegendreQuadratureLineRule(ref_el, (degree + 4) // 2)
     else:
         raise ValueError("Unknown quadrature scheme: %s." % scheme)
 
 
+class EntityQuadratureRule(object):
+    """Quadrature rules on all the entities of one dimension of a cell,
+    mapped from one rule on the reference entity and stored as stacked
+    read-only arrays.
+
+    :attr reference_rule: The rule on the reference entity.
+    :attr points: Array of shape (nentities, npoints, dim) of points
+        in the cell.
+    :attr weights: Array of shape (nentities, npoints) of weights,
+        scaled by the ratio of the volumes of the entity and the
+        reference entity.
+    :attr normals: Array of shape (nentities, dim) of the reference
+        normals (see ``compute_reference_normal``) if the entities are
+        facets, otherwise None.
+    """
+
+    def __init__(self, ref_el, entity_dim, reference_rule):
+        self.ref_el = ref_el
+        self.entity_dim = entity_dim
+        self.reference_rule = reference_rule
+
+        ref_pts = reference_rule.get_points()
+        ref_wts = reference_rule.get_weights()
+        subdim = ref_pts.shape[1]
+        entities = sorted(ref_el.get_topology()[entity_dim])
+        points = []
+        weights = []
+        for e in entities:
+            # Affine entity transform: x -> J x + b
+            transform = ref_el.get_entity_transform(entity_dim, e)
+            b = numpy.asarray(transform(numpy.zeros(subdim)), dtype=float)
+            # For vertices, J is empty and the weight is the reference one
+            J = numpy.zeros((len(b), subdim))
+            for i, v in enumerate(numpy.eye(subdim)):
+                J[:, i] = numpy.asarray(transform(v), dtype=float) - b
+            points.append(numpy.dot(ref_pts, J.T) + b)
+            weights.append(ref_wts * numpy.sqrt(numpy.linalg.det(numpy.dot(J.T, J))))
+        self.points = numpy.array(points).reshape(len(entities), len(ref_wts), -1)
+        self.weights = numpy.array(weights).reshape(len(entities), len(ref_wts))
+
+        if numpy.sum(ref_el.get_dimension()) - numpy.sum(entity_dim) == 1:
+            self.normals = numpy.array([ref_el.compute_reference_normal(entity_dim, e)
+                                        for e in entities], dtype=float)
+            self.normals.setflags(write=False)
+        else:
+            self.normals = None
+        self.points.setflags(write=False)
+        self.weights.setflags(write=False)
+
+
+@memoize_on_cell
+def create_entity_quadrature(ref_el, entity_dim, degree, scheme="default"):
+    """Generate quadrature rules on all entities of a given dimension
+    of a reference cell, that integrate polynomials of order 'degree'
+    exactly.  This is cached.
+
+    :arg ref_el: The FIAT cell.
+    :arg entity_dim: The entity dimension (a tuple for tensor-product
+        cells).
+    :arg degree: The degree of polynomial that the rules should
+        integrate exactly.
+    :arg scheme: The quadrature scheme on the reference entity.
+    :returns: An :class:`EntityQuadratureRule`.
+    """
+    entity_cell = ref_el.construct_subelement(entity_dim)
+    return EntityQuadratureRule(ref_el, entity_dim,
+                                create_quadrature(entity_cell, degree, scheme))
+
+
+def _map_scheme(rule, ref_el):
+    """Map a quadrature rule affinely onto a simplex with the same
+    number of vertices."""
+    if rule.ref_el == ref_el and rule.ref_el.get_vertices() == ref_el.get_vertices():
+        return rule
+    A, b = make_affine_mapping(rule.ref_el.get_vertices(), ref_el.get_vertices())
+    return QuadratureRule(ref_el,
+                          numpy.dot(rule.get_points(), A.T) + b,
+                          abs(numpy.linalg.det(A)) * rule.get_weights())
+
+
 def _fiat_scheme(ref_el, degree):
     """Get quadrature scheme from FIAT interface"""
 
@@ -102,6 +233,28 @@ def _fiat_scheme(ref_el, degree):
     return make_quadrature(ref_el, num_points_per_axis)
 
 
+_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "quadrature_data")
+
+
+@functools.lru_cache(maxsize=None)
+def _tabulated_degrees(name):
+    """Return the sorted degrees of the tabulated rules on a cell."""
+    prefix = name + "-"
+    return sorted(int(f[len(prefix):-len(".txt")])
+                  for f in os.listdir(_DATA_DIR)
+                  if f.startswith(prefix) and f.endswith(".txt"))
+
+
+def _tabulated_scheme(ref_el, name, degree):
+    """Load the tabulated rule of lowest degree at least the given
+    degree on a cell, or return None if there is none."""
+    degrees = [d for d in _tabulated_degrees(name) if d >= degree]
+    if not degrees:
+        return None
+    data = loadtxt(os.path.join(_DATA_DIR, "%s-%d.txt" % (name, degrees[0])), ndmin=2)
+    return QuadratureRule(ref_el, data[:, :-1], data[:, -1])
+
+
 def _triangle_scheme(degree):
     """Return a quadrature scheme on a triangle of specified order. Falls
     back on canonical rule for higher orders."""
@@ -173,8 +326,9 @@ def _triangle_scheme(degree):
         w[6:12] = 0.082851075618374
         w = w/2.0
     else:
-        # Get canonical scheme
-        return _fiat_scheme(UFCTriangle(), degree)
+        # Get tabulated or canonical scheme
+        return _tabulated_scheme(UFCTriangle(), "triangle", degree) or \
+            _fiat_scheme(UFCTriangle(), degree)
 
     # Return scheme
     return QuadratureRule(UFCTriangle(), x, w)
@@ -292,8 +446,9 @@ def _tetrahedron_scheme(degree):
         w[12:24] = 0.0482142857142857
         w = w/6.0
     else:
-        # Get canonical scheme
-        return _fiat_scheme(UFCTetrahedron(), degree)
+        # Get tabulated or canonical scheme
+        return _tabulated_scheme(UFCTetrahedron(), "tetrahedron", degree) or \
+            _fiat_scheme(UFCTetrahedron(), degree)
 
     # Return scheme
     return QuadratureRule(UFCTetrahedron(), x, w)
@@ -15,6 +15,8 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with FIAT. If not, see <http://www.gnu.org/licenses/>.
 
+import numpy
+
 from FIAT.dual_set import DualSet
 from FIAT.finite_element import CiarletElement
 
@@ -43,24 +45,24 @@ class RestrictedElement(CiarletElement):
         # Fetch reference element
         ref_el = element.get_reference_element()
 
-        # Restrict primal set
-        poly_set = element.get_nodal_basis().take(indices)
-
         # Restrict dual set
         dof_counter = 0
         entity_ids = {}
         nodes = []
+        taken = []
         nodes_old = element.dual_basis()
+        keep = set(indices)
         for d, entities in element.entity_dofs().items():
             entity_ids[d] = {}
             for entity, dofs in entities.items():
                 entity_ids[d][entity] = []
                 for dof in dofs:
-                    if dof not in indices:
+                    if dof not in keep:
                         continue
                     entity_ids[d][entity].append(dof_counter)
                     dof_counter += 1
                     nodes.append(nodes_old[dof])
+                    taken.append(dof)
         assert dof_counter == len(indices)
         dual = DualSet(nodes, ref_el, entity_ids)
 
@@ -69,8 +71,45 @@ class RestrictedElement(CiarletElement):
         mapping_new = [mapping_old[dof] for dof in indices]
         assert all(e_mapping == mapping_new[0] for e_mapping in mapping_new)
 
-        # Call constructor of CiarletElement
-        super(RestrictedElement, self).__init__(poly_set, dual, 0, element.get_formdegree(), mapping_new[0])
+        if isinstance(element, CiarletElement) and element.is_nodal():
+            # The restriction of a nodal basis is already nodal with
+            # respect to the restricted dual set, so just select the
+            # members of the parent's nodal basis on first use.  Other
+            # elements need not have a nodal basis at all, so they
+            # take the branch below, which fails here if they do not.
+            self._taken = taken
+            self._poly_set = None
+            super(CiarletElement, self).__init__(ref_el, dual, 0, element.get_formdegree(), mapping_new[0])
+        else:
+            # Restrict primal set
+            poly_set = element.get_nodal_basis().take(indices)
+
+            # Call constructor of CiarletElement
+            super(RestrictedElement, self).__init__(poly_set, dual, 0, element.get_formdegree(), mapping_new[0])
+
+    @property
+    def poly_set(self):
+        """The nodal basis, taken from the parent element on first use."""
+        if self._poly_set is None:
+            self._poly_set = self._element.get_nodal_basis().take(self._taken)
+        return self._poly_set
+
+    @poly_set.setter
+    def poly_set(self, poly_set):
+        self._poly_set = poly_set
+
+    @property
+    def V(self):
+        """The generalized Vandermonde matrix."""
+        try:
+            return self._V
+        except AttributeError:
+            self._V = numpy.eye(len(self._taken))
+            return self._V
+
+    @V.setter
+    def V(self, V):
+        self._V = V
 
 
 def sorted_by_key(mapping):
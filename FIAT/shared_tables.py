@@ -0,0 +1,305 @@
+# Copyright (C) 2018 Imperial College London and others
+#
+# This file is part of FIAT.
+#
+# FIAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FIAT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with FIAT. If not, see <http://www.gnu.org/licenses/>.
+
+"""Sharing of element arrays and tables between processes on one node.
+
+This is opt-in: nothing is shared unless an element is passed to
+:func:`share_element` or tabulated with :func:`tabulate`.  Arrays are
+stored in :mod:`multiprocessing.shared_memory` segments named after the
+fingerprint of their content, so that every process which builds the
+same element finds the segment created by the first one and attaches
+read-only, zero-copy numpy views to it instead of keeping its own copy.
+
+The saving is in memory only: every process still constructs the
+element, and :func:`share_element` then swaps its arrays for the shared
+ones, so start-up time is not reduced.
+
+Segments created by a process are unlinked when that process exits (or
+on :func:`release`); processes which merely attach never unlink them.
+Each process maps at most ``_MAX_TABLES`` table segments: beyond that,
+the least recently used ones whose tables are no longer referenced are
+closed (and unlinked, if the process created them), so they are
+recreated when asked for again.  Element segments are not limited.  A
+segment whose arrays are still referenced when it is released stays
+mapped until a later :func:`release`, or exit, finds them gone.
+Requires Python 3.8 or later.
+"""
+
+import atexit
+import collections
+import json
+import sys
+import time
+
+import numpy
+
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+    shared_memory = None
+
+from FIAT.finite_element import CiarletElement
+from FIAT.fingerprint import compute_fingerprint
+from FIAT.polynomial_set import PolynomialSet
+
+__all__ = ['share_element', 'tabulate', 'release']
+
+# Segment layout: a uint64 ready flag, a uint64 metadata length, the
+# metadata as JSON and then the array data, aligned to _ALIGN bytes.
+_ALIGN = 64
+
+# Seconds to wait for another process to finish filling a segment.
+_TIMEOUT = 60.0
+
+# Maximum number of table segments mapped by a process.
+_MAX_TABLES = 256
+
+# Segments mapped by this process, by name, those it created, and the
+# names of the table segments, least recently used first.
+_segments = {}
+_owned = set()
+_tables = collections.OrderedDict()
+# Reference counts of the mapped segments with no arrays viewing them,
+# by name, and the released (segment, reference counts) pairs which
+# could not be closed yet, because arrays viewing them were alive.
+_refcounts = {}
+_pending = []
+
+
+def share_element(element):
+    """Move the arrays defining an element into shared memory.
+
+    The expansion coefficients, derivative matrices and Vandermonde
+    matrix of the element (or of its sub-elements) are replaced by
+    read-only views of shared segments, which are created if no other
+    process has already done so.
+
+    :arg element: The FIAT finite element.
+    :returns: The element.
+    """
+    subelements = _sub_elements(element)
+    if subelements is not None:
+        for e in subelements:
+            share_element(e)
+        return element
+
+    poly_set = element.get_nodal_basis()
+    dmats = poly_set.get_dmats()
+    arrays = {"coeffs": poly_set.get_coeffs(), "V": element.V}
+    arrays.update(("dmats%d" % i, d) for i, d in enumerate(dmats))
+    views = _share(_segment_name("element", element.fingerprint()), lambda: arrays)
+
+    element.poly_set = PolynomialSet(poly_set.get_reference_element(),
+                                     poly_set.get_degree(),
+                                     poly_set.get_embedded_degree(),
+                                     poly_set.get_expansion_set(),
+                                     views["coeffs"],
+                                     [views["dmats%d" % i] for i in range(len(dmats))])
+    element.V = views["V"]
+    return element
+
+
+def tabulate(element, order, points, entity=None):
+    """Tabulate an element through the shared table cache.
+
+    The table is computed by the first process asking for it, all
+    other processes get read-only views of the same memory.
+
+    :arg element: The FIAT finite element.
+    :arg order: The maximum order of derivative.
+    :arg points: An iterable of points.
+    :arg entity: Optional (dimension, entity number) pair
+                 indicating which topological entity of the
+                 reference element to tabulate on.
+    :returns: A dict of read-only arrays, as from ``element.tabulate``.
+    """
+    points = numpy.asarray(points, dtype=float)
+    key = (element.fingerprint(), order, points, entity)
+    name = _segment_name("table", compute_fingerprint(*key))
+    views = _share(name, lambda: {json.dumps(alpha): table
+                                  for alpha, table in element.tabulate(order, points, entity).items()})
+    _tables[name] = None
+    _tables.move_to_end(name)
+    for old in list(_tables)[:-1]:
+        if len(_tables) <= _MAX_TABLES:
+            break
+        # Tables which are still referenced are not evicted
+        if _try_close(_segments[old], _refcounts[old]):
+            _forget(old, unlink=True)
+    return {tuple(json.loads(alpha)): table for alpha, table in views.items()}
+
+
+def release(unlink=True):
+    """Close the shared segments mapped by this process.  Segments
+    which arrays still view stay mapped until a later call finds the
+    arrays gone; this is also called at exit.
+
+    :arg unlink: Also unlink the segments this process created.
+        Existing mappings in other processes stay valid, but new
+        requests will create the segments again.
+    """
+    _pending[:] = [(shm, refs) for shm, refs in _pending if not _try_close(shm, refs)]
+    for name in list(_segments):
+        shm, refs = _segments[name], _refcounts[name]
+        if not _try_close(shm, refs):
+            _pending.append((shm, refs))
+        _forget(name, unlink)
+
+
+atexit.register(release)
+
+
+def _references(shm):
+    """Return the reference counts of the mapping and buffer of a
+    segment, which arrays viewing it hold (depending on the numpy
+    version, without exporting the buffer)."""
+    return sys.getrefcount(shm._mmap), sys.getrefcount(shm._buf)
+
+
+def _try_close(shm, refs):
+    """Close a segment, returning False if arrays viewing it are
+    still alive.
+
+    :arg refs: The reference counts of the segment without any such
+        arrays, from :func:`_references`.
+    """
+    if _references(shm) != refs:
+        return False
+    try:
+        shm.close()
+        return True
+    except BufferError:
+        return False
+
+
+def _forget(name, unlink):
+    """Drop a segment from the bookkeeping of this process and, if
+    unlink is true and this process created it, unlink it."""
+    _tables.pop(name, None)
+    _refcounts.pop(name)
+    shm = _segments.pop(name)
+    if name in _owned:
+        _owned.discard(name)
+        if unlink:
+            shm.unlink()
+
+
+def _sub_elements(element):
+    """Return the sub-elements of an element which does not own a
+    nodal basis, or None."""
+    if isinstance(element, CiarletElement) and \
+       type(element).get_nodal_basis is CiarletElement.get_nodal_basis:
+        return None
+    for attr in ("_elements", "element", "_element", "dg_elements"):
+        if hasattr(element, attr):
+            sub = getattr(element, attr)
+            if isinstance(sub, dict):
+                return tuple(sub.values())
+            return tuple(sub) if isinstance(sub, (tuple, list)) else (sub,)
+    if hasattr(element, "factors"):
+        return tuple(element.factors)
+    raise NotImplementedError("Do not know how to share %s" % type(element).__name__)
+
+
+def _segment_name(kind, fingerprint):
+    return "fiat_" + compute_fingerprint(kind, fingerprint)[:24]
+
+
+def _share(name, make_arrays):
+    """Return read-only views of a dict of arrays stored in the named
+    shared segment, calling make_arrays to fill the segment only if no
+    process has created it yet."""
+    if shared_memory is None:
+        raise RuntimeError("Shared memory tables require Python 3.8 or later")
+
+    shm = _segments.get(name)
+    if shm is None:
+        try:
+            shm = _attach(name)
+        except FileNotFoundError:
+            shm = _create(name, make_arrays)
+        _segments[name] = shm
+        _refcounts[name] = _references(shm)
+    return _views(shm)
+
+
+def _create(name, make_arrays):
+    arrays = make_arrays()
+    metadata, nbytes = _layout(arrays)
+    header = json.dumps(metadata).encode()
+    data_offset = _aligned(16 + len(header))
+    try:
+        shm = shared_memory.SharedMemory(name, create=True,
+                                         size=max(data_offset + nbytes, 1))
+    except FileExistsError:
+        # Another process got there first
+        return _attach(name)
+    buf = shm.buf
+    flags = numpy.ndarray((2,), dtype=numpy.uint64, buffer=buf)
+    flags[1] = len(header)
+    buf[16:16 + len(header)] = header
+    for key, (dtype, shape, offset) in metadata.items():
+        numpy.ndarray(shape, dtype=dtype, buffer=buf,
+                      offset=data_offset + offset)[...] = arrays[key]
+    flags[0] = 1
+    _owned.add(name)
+    return shm
+
+
+def _attach(name):
+    shm = shared_memory.SharedMemory(name)
+    # The creating process is responsible for unlinking the segment
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    flags = numpy.ndarray((2,), dtype=numpy.uint64, buffer=shm.buf)
+    deadline = time.time() + _TIMEOUT
+    while not flags[0]:
+        if time.time() > deadline:
+            raise RuntimeError("Timed out waiting for shared segment %s" % name)
+        time.sleep(0.001)
+    return shm
+
+
+def _layout(arrays):
+    metadata = {}
+    nbytes = 0
+    for key in sorted(arrays):
+        array = numpy.asarray(arrays[key])
+        metadata[key] = (array.dtype.str, array.shape, nbytes)
+        nbytes = _aligned(nbytes + array.nbytes)
+    return metadata, nbytes
+
+
+def _views(shm):
+    buf = shm.buf
+    flags = numpy.ndarray((2,), dtype=numpy.uint64, buffer=buf)
+    length = int(flags[1])
+    metadata = json.loads(bytes(buf[16:16 + length]).decode())
+    data_offset = _aligned(16 + length)
+    views = {}
+    for key, (dtype, shape, offset) in metadata.items():
+        view = numpy.ndarray(tuple(shape), dtype=dtype, buffer=buf,
+                             offset=data_offset + offset)
+        view.setflags(write=False)
+        views[key] = view
+    return views
+
+
+def _aligned(n):
+    return -(-n // _ALIGN) * _ALIGN
@@ -18,6 +18,7 @@
 # along with FIAT. If not, see <http://www.gnu.org/licenses/>.
 
 import numpy
+from itertools import product
 from FIAT.finite_element import FiniteElement
 from FIAT.reference_element import TensorProductCell, UFCQuadrilateral, UFCHexahedron, flatten_entities, compute_unflattening_map
 from FIAT.dual_set import DualSet
@@ -34,196 +35,246 @@ def _first_point_pair(node):
     return tuple(node.get_point_dict().items())[0]
 
 
+def _kronecker_subscripts(value_shapes, shared_points):
+    """Return einsum subscripts for the outer product of tables of
+    shapes ``(n_i, value_shape_i, q_i)``.
+
+    :arg value_shapes: The value shapes of the tables.
+    :arg shared_points: Whether the tables are at the same points,
+        rather than at the factors of a tensor product of points.
+    """
+    letters = iter("abcdefghijklmnopqrstuvwxy")
+    inputs = []
+    basis = []
+    values = []
+    points = []
+    for vs in value_shapes:
+        i = next(letters)
+        v = "".join(next(letters) for _ in vs)
+        p = "z" if shared_points else next(letters)
+        inputs.append(i + v + p)
+        basis.append(i)
+        values.append(v)
+        points.append(p)
+    if shared_points:
+        points = ["z"]
+    return "%s->%s" % (",".join(inputs), "".join(basis + values + points))
+
+
+def _unique_points(points):
+    """Return the distinct rows of a points array and the index of
+    each point among them."""
+    if len(points) < 2:
+        return points, slice(None)
+    # The points of a tensor product grid repeat, whichever factor
+    # they belong to, starting with the first point.  Only pay for
+    # sorting the points when the first one recurs.
+    if not (points[1:] == points[0]).all(axis=1).any():
+        return points, slice(None)
+    unique, index = numpy.unique(points, axis=0, return_inverse=True)
+    if len(unique) == len(points):
+        return points, slice(None)
+    return unique, index
+
+
+def _product_nodes(Anodes, Bnodes, ref_el):
+    """Return the nodes of the product of two dual bases, the nodes
+    of B varying fastest."""
+    # build the dual set by inspecting the current dual
+    # sets item by item.
+    # Currently supported cases:
+    # PointEval x PointEval = PointEval [scalar x scalar = scalar]
+    # PointScaledNormalEval x PointEval = PointScaledNormalEval [vector x scalar = vector]
+    # ComponentPointEvaluation x PointEval [vector x scalar = vector]
+    nodes = []
+    for Anode in Anodes:
+        if isinstance(Anode, functional.PointEvaluation):
+            for Bnode in Bnodes:
+                if isinstance(Bnode, functional.PointEvaluation):
+                    # case: PointEval x PointEval
+                    # the PointEval functional just requires the
+                    # coordinates. these are currently stored as
+                    # the key of a one-item dictionary. we retrieve
+                    # these by calling get_point_dict(), and
+                    # use the concatenation to make a new PointEval
+                    nodes.append(functional.PointEvaluation(ref_el, _first_point(Anode) + _first_point(Bnode)))
+                elif isinstance(Bnode, functional.IntegralMoment):
+                    # dummy functional for product with integral moments
+                    nodes.append(functional.Functional(None, None, None,
+                                                       {}, "Undefined"))
+                elif isinstance(Bnode, functional.PointDerivative):
+                    # dummy functional for product with point derivative
+                    nodes.append(functional.Functional(None, None, None,
+                                                       {}, "Undefined"))
+                else:
+                    raise NotImplementedError("unsupported functional type")
+
+        elif isinstance(Anode, functional.PointScaledNormalEvaluation):
+            for Bnode in Bnodes:
+                if isinstance(Bnode, functional.PointEvaluation):
+                    # case: PointScaledNormalEval x PointEval
+                    # this could be wrong if the second shape
+                    # has spatial dimension >1, since we are not
+                    # explicitly scaling by facet size
+                    if len(_first_point(Bnode)) > 1:
+                        # TODO: support this case one day
+                        raise NotImplementedError("PointScaledNormalEval x PointEval is not yet supported if the second shape has dimension > 1")
+                    # We cannot make a new functional.PSNEval in
+                    # the natural way, since it tries to compute
+                    # the normal vector by itself.
+                    # Instead, we create things manually, and
+                    # call Functional() with these arguments
+                    sd = ref_el.get_spatial_dimension()
+                    # The pt_dict is a one-item dictionary containing
+                    # the details of the functional.
+                    # The key is the spatial coordinate, which
+                    # is just a concatenation of the two parts.
+                    # The value is a list of tuples, representing
+                    # the normal vector (scaled by the volume of
+                    # the facet) at that point.
+                    # Each tuple looks like (foo, (i,)); the i'th
+                    # component of the scaled normal is foo.
+
+                    # The following line is only valid when the second
+                    # shape has spatial dimension 1 (enforced above)
+                    Apoint, Avalue = _first_point_pair(Anode)
+                    pt_dict = {Apoint + _first_point(Bnode): Avalue + [(0.0, (len(Apoint),))]}
+
+                    # The following line should be used in the
+                    # general case
+                    # pt_dict = {Anode.get_point_dict().keys()[0] + Bnode.get_point_dict().keys()[0]: Anode.get_point_dict().values()[0] + [(0.0, (ii,)) for ii in range(len(Anode.get_point_dict().keys()[0]), len(Anode.get_point_dict().keys()[0]) + len(Bnode.get_point_dict().keys()[0]))]}
+
+                    # THE FOLLOWING IS PROBABLY CORRECT BUT UNTESTED
+                    shp = (sd,)
+                    nodes.append(functional.Functional(ref_el, shp, pt_dict, {}, "PointScaledNormalEval"))
+                else:
+                    raise NotImplementedError("unsupported functional type")
+
+        elif isinstance(Anode, functional.PointEdgeTangentEvaluation):
+            for Bnode in Bnodes:
+                if isinstance(Bnode, functional.PointEvaluation):
+                    # case: PointEdgeTangentEval x PointEval
+                    # this is very similar to the case above, so comments omitted
+                    if len(_first_point(Bnode)) > 1:
+                        raise NotImplementedError("PointEdgeTangentEval x PointEval is not yet supported if the second shape has dimension > 1")
+                    sd = ref_el.get_spatial_dimension()
+                    Apoint, Avalue = _first_point_pair(Anode)
+                    pt_dict = {Apoint + _first_point(Bnode): Avalue + [(0.0, (len(Apoint),))]}
+
+                    # THE FOLLOWING IS PROBABLY CORRECT BUT UNTESTED
+                    shp = (sd,)
+                    nodes.append(functional.Functional(ref_el, shp, pt_dict, {}, "PointEdgeTangent"))
+                else:
+                    raise NotImplementedError("unsupported functional type")
+
+        elif isinstance(Anode, functional.ComponentPointEvaluation):
+            for Bnode in Bnodes:
+                if isinstance(Bnode, functional.PointEvaluation):
+                    # case: ComponentPointEval x PointEval
+                    # the CptPointEval functional requires the component
+                    # and the coordinates. very similar to PE x PE case.
+                    sd = ref_el.get_spatial_dimension()
+                    nodes.append(functional.ComponentPointEvaluation(ref_el, Anode.comp, (sd,), _first_point(Anode) + _first_point(Bnode)))
+                else:
+                    raise NotImplementedError("unsupported functional type")
+
+        elif isinstance(Anode, functional.FrobeniusIntegralMoment):
+            for Bnode in Bnodes:
+                if isinstance(Bnode, functional.PointEvaluation):
+                    # case: FroIntMom x PointEval
+                    sd = ref_el.get_spatial_dimension()
+                    pt_dict = {}
+                    pt_old = Anode.get_point_dict()
+                    for pt in pt_old:
+                        pt_dict[pt+_first_point(Bnode)] = pt_old[pt] + [(0.0, sd-1)]
+                    # THE FOLLOWING IS PROBABLY CORRECT BUT UNTESTED
+                    shp = (sd,)
+                    nodes.append(functional.Functional(ref_el, shp, pt_dict, {}, "FrobeniusIntegralMoment"))
+                else:
+                    raise NotImplementedError("unsupported functional type")
+
+        elif isinstance(Anode, functional.IntegralMoment):
+            for Bnode in Bnodes:
+                if isinstance(Bnode, functional.PointEvaluation):
+                    # case: IntMom x PointEval
+                    sd = ref_el.get_spatial_dimension()
+                    pt_dict = {}
+                    pt_old = Anode.get_point_dict()
+                    for pt in pt_old:
+                        pt_dict[pt+_first_point(Bnode)] = pt_old[pt]
+                    # THE FOLLOWING IS PROBABLY CORRECT BUT UNTESTED
+                    shp = (sd,)
+                    nodes.append(functional.Functional(ref_el, shp, pt_dict, {}, "IntegralMoment"))
+                else:
+                    raise NotImplementedError("unsupported functional type")
+
+        elif isinstance(Anode, functional.Functional):
+            # this should catch everything else
+            for Bnode in Bnodes:
+                nodes.append(functional.Functional(None, None, None, {}, "Undefined"))
+        else:
+            raise NotImplementedError("unsupported functional type")
+    return nodes
+
+
 class TensorProductElement(FiniteElement):
     """Class implementing a finite element that is the tensor product
-    of two existing finite elements."""
+    of two or more existing finite elements.
+
+    :arg factors: The factor elements.  At most one of them may be
+        vector-valued and at most one may have a non-affine mapping.
+
+    :func:`~FIAT.hdivcurl.Hdiv` and :func:`~FIAT.hdivcurl.Hcurl` only
+    accept products of two factors.
+    """
 
-    def __init__(self, A, B):
+    def __init__(self, *factors):
+        if len(factors) < 2:
+            raise ValueError("TensorProductElement needs at least two factors")
         # set up simple things
-        order = min(A.get_order(), B.get_order())
-        if A.get_formdegree() is None or B.get_formdegree() is None:
+        order = min(e.get_order() for e in factors)
+        formdegrees = [e.get_formdegree() for e in factors]
+        if None in formdegrees:
             formdegree = None
         else:
-            formdegree = A.get_formdegree() + B.get_formdegree()
+            formdegree = sum(formdegrees)
 
         # set up reference element
-        ref_el = TensorProductCell(A.get_reference_element(),
-                                   B.get_reference_element())
-
-        if A.mapping()[0] != "affine" and B.mapping()[0] == "affine":
-            mapping = A.mapping()[0]
-        elif B.mapping()[0] != "affine" and A.mapping()[0] == "affine":
-            mapping = B.mapping()[0]
-        elif A.mapping()[0] == "affine" and B.mapping()[0] == "affine":
-            mapping = "affine"
-        else:
+        ref_el = TensorProductCell(*[e.get_reference_element() for e in factors])
+
+        mappings = [e.mapping()[0] for e in factors if e.mapping()[0] != "affine"]
+        if len(mappings) > 1:
             raise ValueError("check tensor product mappings - at least one must be affine")
+        mapping = mappings[0] if mappings else "affine"
 
-        # set up entity_ids
-        Adofs = A.entity_dofs()
-        Bdofs = B.entity_dofs()
-        Bsdim = B.space_dimension()
+        # set up entity_ids: entities and dofs are numbered with the
+        # last factor varying fastest.
+        factor_dofs = [e.entity_dofs() for e in factors]
+        sdims = [e.space_dimension() for e in factors]
         entity_ids = {}
-
-        for curAdim in Adofs:
-            for curBdim in Bdofs:
-                entity_ids[(curAdim, curBdim)] = {}
-                dim_cur = 0
-                for entityA in Adofs[curAdim]:
-                    for entityB in Bdofs[curBdim]:
-                        entity_ids[(curAdim, curBdim)][dim_cur] = \
-                            [x*Bsdim + y for x in Adofs[curAdim][entityA]
-                                for y in Bdofs[curBdim][entityB]]
-                        dim_cur += 1
+        for dim in product(*factor_dofs):
+            entity_ids[dim] = {}
+            for i, entities in enumerate(product(*[dofs[d] for dofs, d in zip(factor_dofs, dim)])):
+                ids = [0]
+                for dofs, d, e, sdim in zip(factor_dofs, dim, entities, sdims):
+                    ids = [x*sdim + y for x in ids for y in dofs[d][e]]
+                entity_ids[dim][i] = ids
 
         # set up dual basis
-        Anodes = A.dual_basis()
-        Bnodes = B.dual_basis()
-
-        # build the dual set by inspecting the current dual
-        # sets item by item.
-        # Currently supported cases:
-        # PointEval x PointEval = PointEval [scalar x scalar = scalar]
-        # PointScaledNormalEval x PointEval = PointScaledNormalEval [vector x scalar = vector]
-        # ComponentPointEvaluation x PointEval [vector x scalar = vector]
-        nodes = []
-        for Anode in Anodes:
-            if isinstance(Anode, functional.PointEvaluation):
-                for Bnode in Bnodes:
-                    if isinstance(Bnode, functional.PointEvaluation):
-                        # case: PointEval x PointEval
-                        # the PointEval functional just requires the
-                        # coordinates. these are currently stored as
-                        # the key of a one-item dictionary. we retrieve
-                        # these by calling get_point_dict(), and
-                        # use the concatenation to make a new PointEval
-                        nodes.append(functional.PointEvaluation(ref_el, _first_point(Anode) + _first_point(Bnode)))
-                    elif isinstance(Bnode, functional.IntegralMoment):
-                        # dummy functional for product with integral moments
-                        nodes.append(functional.Functional(None, None, None,
-                                                           {}, "Undefined"))
-                    elif isinstance(Bnode, functional.PointDerivative):
-                        # dummy functional for product with point derivative
-                        nodes.append(functional.Functional(None, None, None,
-                                                           {}, "Undefined"))
-                    else:
-                        raise NotImplementedError("unsupported functional type")
-
-            elif isinstance(Anode, functional.PointScaledNormalEvaluation):
-                for Bnode in Bnodes:
-                    if isinstance(Bnode, functional.PointEvaluation):
-                        # case: PointScaledNormalEval x PointEval
-                        # this could be wrong if the second shape
-                        # has spatial dimension >1, since we are not
-                        # explicitly scaling by facet size
-                        if len(_first_point(Bnode)) > 1:
-                            # TODO: support this case one day
-                            raise NotImplementedError("PointScaledNormalEval x PointEval is not yet supported if the second shape has dimension > 1")
-                        # We cannot make a new functional.PSNEval in
-                        # the natural way, since it tries to compute
-                        # the normal vector by itself.
-                        # Instead, we create things manually, and
-                        # call Functional() with these arguments
-                        sd = ref_el.get_spatial_dimension()
-                        # The pt_dict is a one-item dictionary containing
-                        # the details of the functional.
-                        # The key is the spatial coordinate, which
-                        # is just a concatenation of the two parts.
-                        # The value is a list of tuples, representing
-                        # the normal vector (scaled by the volume of
-                        # the facet) at that point.
-                        # Each tuple looks like (foo, (i,)); the i'th
-                        # component of the scaled normal is foo.
-
-                        # The following line is only valid when the second
-                        # shape has spatial dimension 1 (enforced above)
-                        Apoint, Avalue = _first_point_pair(Anode)
-                        pt_dict = {Apoint + _first_point(Bnode): Avalue + [(0.0, (len(Apoint),))]}
-
-                        # The following line should be used in the
-                        # general case
-                        # pt_dict = {Anode.get_point_dict().keys()[0] + Bnode.get_point_dict().keys()[0]: Anode.get_point_dict().values()[0] + [(0.0, (ii,)) for ii in range(len(Anode.get_point_dict().keys()[0]), len(Anode.get_point_dict().keys()[0]) + len(Bnode.get_point_dict().keys()[0]))]}
-
-                        # THE FOLLOWING IS PROBABLY CORRECT BUT UNTESTED
-                        shp = (sd,)
-                        nodes.append(functional.Functional(ref_el, shp, pt_dict, {}, "PointScaledNormalEval"))
-                    else:
-                        raise NotImplementedError("unsupported functional type")
-
-            elif isinstance(Anode, functional.PointEdgeTangentEvaluation):
-                for Bnode in Bnodes:
-                    if isinstance(Bnode, functional.PointEvaluation):
-                        # case: PointEdgeTangentEval x PointEval
-                        # this is very similar to the case above, so comments omitted
-                        if len(_first_point(Bnode)) > 1:
-                            raise NotImplementedError("PointEdgeTangentEval x PointEval is not yet supported if the second shape has dimension > 1")
-                        sd = ref_el.get_spatial_dimension()
-                        Apoint, Avalue = _first_point_pair(Anode)
-                        pt_dict = {Apoint + _first_point(Bnode): Avalue + [(0.0, (len(Apoint),))]}
-
-                        # THE FOLLOWING IS PROBABLY CORRECT BUT UNTESTED
-                        shp = (sd,)
-                        nodes.append(functional.Functional(ref_el, shp, pt_dict, {}, "PointEdgeTangent"))
-                    else:
-                        raise NotImplementedError("unsupported functional type")
-
-            elif isinstance(Anode, functional.ComponentPointEvaluation):
-                for Bnode in Bnodes:
-                    if isinstance(Bnode, functional.PointEvaluation):
-                        # case: ComponentPointEval x PointEval
-                        # the CptPointEval functional requires the component
-                        # and the coordinates. very similar to PE x PE case.
-                        sd = ref_el.get_spatial_dimension()
-                        nodes.append(functional.ComponentPointEvaluation(ref_el, Anode.comp, (sd,), _first_point(Anode) + _first_point(Bnode)))
-                    else:
-                        raise NotImplementedError("unsupported functional type")
-
-            elif isinstance(Anode, functional.FrobeniusIntegralMoment):
-                for Bnode in Bnodes:
-                    if isinstance(Bnode, functional.PointEvaluation):
-                        # case: FroIntMom x PointEval
-                        sd = ref_el.get_spatial_dimension()
-                        pt_dict = {}
-                        pt_old = Anode.get_point_dict()
-                        for pt in pt_old:
-                            pt_dict[pt+_first_point(Bnode)] = pt_old[pt] + [(0.0, sd-1)]
-                        # THE FOLLOWING IS PROBABLY CORRECT BUT UNTESTED
-                        shp = (sd,)
-                        nodes.append(functional.Functional(ref_el, shp, pt_dict, {}, "FrobeniusIntegralMoment"))
-                    else:
-                        raise NotImplementedError("unsupported functional type")
-
-            elif isinstance(Anode, functional.IntegralMoment):
-                for Bnode in Bnodes:
-                    if isinstance(Bnode, functional.PointEvaluation):
-                        # case: IntMom x PointEval
-                        sd = ref_el.get_spatial_dimension()
-                        pt_dict = {}
-                        pt_old = Anode.get_point_dict()
-                        for pt in pt_old:
-                            pt_dict[pt+_first_point(Bnode)] = pt_old[pt]
-                        # THE FOLLOWING IS PROBABLY CORRECT BUT UNTESTED
-                        shp = (sd,)
-                        nodes.append(functional.Functional(ref_el, shp, pt_dict, {}, "IntegralMoment"))
-                    else:
-                        raise NotImplementedError("unsupported functional type")
-
-            elif isinstance(Anode, functional.Functional):
-                # this should catch everything else
-                for Bnode in Bnodes:
-                    nodes.append(functional.Functional(None, None, None, {}, "Undefined"))
-            else:
-                raise NotImplementedError("unsupported functional type")
+        nodes = factors[0].dual_basis()
+        for e in factors[1:]:
+            nodes = _product_nodes(nodes, e.dual_basis(), ref_el)
 
         dual = dual_set.DualSet(nodes, ref_el, entity_ids)
 
         super(TensorProductElement, self).__init__(ref_el, dual, order, formdegree, mapping)
         # Set up constituent elements
-        self.A = A
-        self.B = B
+        self.factors = tuple(factors)
+        if len(factors) == 2:
+            self.A, self.B = factors
 
         # degree for quadrature rule
-        self.polydegree = max(A.degree(), B.degree())
+        self.polydegree = max(e.degree() for e in factors)
 
     def degree(self):
         """Return the degree of the (embedding) polynomial space."""
@@ -239,123 +290,122 @@ class TensorProductElement(FiniteElement):
         finite element."""
         raise NotImplementedError("get_coeffs not implemented")
 
-    def tabulate(self, order, points, entity=None):
-        """Return tabulated values of derivatives up to given order of
-        basis functions at given points."""
+    def _factor_entity(self, entity):
+        """Split an entity of the product cell into entities of the
+        factor cells."""
         if entity is None:
             entity = (self.ref_el.get_dimension(), 0)
         entity_dim, entity_id = entity
 
         shape = tuple(len(c.get_topology()[d])
                       for c, d in zip(self.ref_el.cells, entity_dim))
-        idA, idB = numpy.unravel_index(entity_id, shape)
+        ids = numpy.unravel_index(entity_id, shape)
+        return entity_dim, tuple((d, int(i)) for d, i in zip(entity_dim, ids))
 
+    def tabulate(self, order, points, entity=None):
+        """Return tabulated values of derivatives up to given order of
+        basis functions at given points."""
         # Factor the entity argument to get entities of the component elements
-        entityA_dim, entityB_dim = entity_dim
-        entityA = (entityA_dim, idA)
-        entityB = (entityB_dim, idB)
-
-        pointsAdim, pointsBdim = [c.get_spatial_dimension()
-                                  for c in self.ref_el.construct_subelement(entity_dim).cells]
-        pointsA = [point[:pointsAdim] for point in points]
-        pointsB = [point[pointsAdim:pointsAdim + pointsBdim] for point in points]
+        entity_dim, entities = self._factor_entity(entity)
 
-        Asdim = self.A.ref_el.get_spatial_dimension()
-        Bsdim = self.B.ref_el.get_spatial_dimension()
-        # Note that for entities other than cells, the following
-        # tabulations are already appropriately zero-padded so no
-        # additional zero padding is required.
-        Atab = self.A.tabulate(order, pointsA, entityA)
-        Btab = self.B.tabulate(order, pointsB, entityB)
+        point_dims = [c.get_spatial_dimension()
+                      for c in self.ref_el.construct_subelement(entity_dim).cells]
+        points = numpy.asarray(points, dtype=float).reshape(len(points), sum(point_dims))
         npoints = len(points)
 
-        # allow 2 scalar-valued FE spaces, or 1 scalar-valued,
-        # 1 vector-valued. Combining 2 vector-valued spaces
+        # allow any number of scalar-valued FE spaces and at most one
+        # vector-valued one.  Combining several vector-valued spaces
         # into a tensor-valued space via an outer-product
         # seems to be a sensible general option, but I don't
         # know how to handle the nestedness of the arrays
         # if someone then tries to make a new "tensor finite
         # element" where one component is already a
         # tensor-valued space!
-        A_valuedim = len(self.A.value_shape())  # scalar: 0, vector: 1
-        B_valuedim = len(self.B.value_shape())  # scalar: 0, vector: 1
-        if A_valuedim + B_valuedim > 1:
-            raise NotImplementedError("tabulate does not support two vector-valued inputs")
+        value_shapes = [e.value_shape() for e in self.factors]
+        if sum(len(vs) for vs in value_shapes) > 1:
+            raise NotImplementedError("tabulate does not support more than one vector-valued input")
+
+        # Note that for entities other than cells, the following
+        # tabulations are already appropriately zero-padded so no
+        # additional zero padding is required.
+        # Points on a tensor grid repeat the coordinates of each
+        # factor, so only tabulate the factors at the distinct ones.
+        tables = []
+        indices = []
+        for e, e_entity, s in zip(self.factors, entities,
+                                  TensorProductCell._split_slices(point_dims)):
+            e_points, index = _unique_points(points[:, s])
+            tables.append(e.tabulate(order, e_points, e_entity))
+            indices.append(index)
+
+        # For each point, take the outer product of the basis
+        # functions of all factors evaluated at that point, writing
+        # temp[f_i][g_j]...[(component)][point].  Flattening the
+        # basis function indices orders the basis functions f1g1,
+        # f1g2, ..., f2g1, f2g2, ... which is compatible with the
+        # entity_dofs order.
+        subscripts = _kronecker_subscripts(value_shapes, True)
+        # Not self.value_shape(), which Hdiv and Hcurl redefine
+        value_shape = sum(value_shapes, ())
+        sdims = [e.ref_el.get_spatial_dimension() for e in self.factors]
+        alpha_slices = TensorProductCell._split_slices(sdims)
         result = {}
         for i in range(order + 1):
-            alphas = mis(Asdim+Bsdim, i)  # thanks, Rob!
+            alphas = mis(sum(sdims), i)  # thanks, Rob!
             for alpha in alphas:
-                if A_valuedim == 0 and B_valuedim == 0:
-                    # for each point, get outer product of (A's basis
-                    # functions f1, f2, ... evaluated at that point)
-                    # with (B's basis functions g1, g2, ... evaluated
-                    # at that point). This gives temp[point][f_i][g_j].
-                    # Flatten this, so bfs are
-                    # in the order f1g1, f1g2, ..., f2g1, f2g2, ...
-                    # which is compatible with the entity_dofs order.
-                    # We now have temp[point][full basis function]
-                    # Transpose this to get temp[bf][point],
-                    # and we are done.
-                    temp = numpy.array([numpy.outer(
-                                       Atab[alpha[0:Asdim]][..., j],
-                                       Btab[alpha[Asdim:Asdim+Bsdim]][..., j])
-                        .ravel() for j in range(npoints)])
-                    result[alpha] = temp.transpose()
-                elif A_valuedim == 1 and B_valuedim == 0:
-                    # similar to above, except A's basis functions
-                    # are now vector-valued. numpy.outer flattens the
-                    # array, so it's like taking the OP of
-                    # f1_x, f1_y, f2_x, f2_y, ... with g1, g2, ...
-                    # this gives us
-                    # temp[point][f1x, f1y, f2x, f2y, ...][g_j].
-                    # reshape once to get temp[point][f_i][x/y][g_j]
-                    # transpose to get temp[point][x/y][f_i][g_j]
-                    # reshape to flatten the last two indices, this
-                    # gives us temp[point][x/y][full bf_i]
-                    # finally, transpose the first and last indices
-                    # to get temp[bf_i][x/y][point], and we are done.
-                    temp = numpy.array([numpy.outer(
-                                       Atab[alpha[0:Asdim]][..., j],
-                                       Btab[alpha[Asdim:Asdim+Bsdim]][..., j])
-                        for j in range(npoints)])
-                    assert temp.shape[1] % 2 == 0
-                    temp2 = temp.reshape((temp.shape[0],
-                                          temp.shape[1]//2,
-                                          2,
-                                          temp.shape[2]))\
-                        .transpose(0, 2, 1, 3)\
-                        .reshape((temp.shape[0], 2, -1))\
-                        .transpose(2, 1, 0)
-                    result[alpha] = temp2
-                elif A_valuedim == 0 and B_valuedim == 1:
-                    # as above, with B's functions now vector-valued.
-                    # we now do... [numpy.outer ... for ...] gives
-                    # temp[point][f_i][g1x,g1y,g2x,g2y,...].
-                    # reshape to temp[point][f_i][g_j][x/y]
-                    # flatten middle: temp[point][full bf_i][x/y]
-                    # transpose to temp[bf_i][x/y][point]
-                    temp = numpy.array([numpy.outer(
-                        Atab[alpha[0:Asdim]][..., j],
-                        Btab[alpha[Asdim:Asdim+Bsdim]][..., j])
-                        for j in range(len(Atab[alpha[0:Asdim]][0]))])
-                    assert temp.shape[2] % 2 == 0
-                    temp2 = temp.reshape((temp.shape[0], temp.shape[1],
-                                          temp.shape[2]//2, 2))\
-                        .reshape((temp.shape[0], -1, 2))\
-                        .transpose(1, 2, 0)
-                    result[alpha] = temp2
+                vals = [table[alpha[s]][..., index]
+                        for table, s, index in zip(tables, alpha_slices, indices)]
+                temp = numpy.empty(tuple(len(v) for v in vals) + value_shape + (npoints,),
+                                   dtype=numpy.result_type(*vals))
+                numpy.einsum(subscripts, *vals, out=temp)
+                result[alpha] = temp.reshape((-1,) + value_shape + (npoints,))
+        return result
+
+    def tabulate_factored(self, order, points, entity=None):
+        """Return tabulated values of derivatives up to given order of
+        basis functions at the tensor product of point sets on the
+        factor cells, as :class:`FactoredTable` objects.
+
+        :arg order: The maximum order of derivative.
+        :arg points: A :class:`~FIAT.quadrature.TensorProductQuadratureRule`,
+            or a sequence of point sets on the factor cells (or on the
+            factor entities, if an entity is given), one per factor.
+        :arg entity: Optional (dimension, entity number) pair
+            indicating which topological entity of the reference
+            element to tabulate on.
+        :returns: A dict mapping derivative multi-indices to
+            :class:`FactoredTable` objects.  These describe the same
+            tables as :meth:`tabulate` at the product points (the last
+            factor varying fastest), see :func:`materialise`.
+        """
+        value_shapes = tuple(e.value_shape() for e in self.factors)
+        if self.value_shape() != sum(value_shapes, ()):
+            # Hdiv and Hcurl embed the values into a larger space
+            raise NotImplementedError("tabulate_factored does not support Hdiv or Hcurl elements")
+        if hasattr(points, "factors"):
+            points = [q.get_points() for q in points.factors]
+        if len(points) != len(self.factors):
+            raise ValueError("Need one point set per factor element")
+
+        entity_dim, entities = self._factor_entity(entity)
+        tables = [e.tabulate(order, e_points, e_entity)
+                  for e, e_points, e_entity in zip(self.factors, points, entities)]
+
+        sdims = [e.ref_el.get_spatial_dimension() for e in self.factors]
+        alpha_slices = TensorProductCell._split_slices(sdims)
+        result = {}
+        for i in range(order + 1):
+            for alpha in mis(sum(sdims), i):
+                result[alpha] = FactoredTable([table[alpha[s]] for table, s in zip(tables, alpha_slices)],
+                                              value_shapes)
         return result
 
     def value_shape(self):
         """Return the value shape of the finite element functions."""
-        if len(self.A.value_shape()) == 0 and len(self.B.value_shape()) == 0:
-            return ()
-        elif len(self.A.value_shape()) == 1 and len(self.B.value_shape()) == 0:
-            return (self.A.value_shape()[0],)
-        elif len(self.A.value_shape()) == 0 and len(self.B.value_shape()) == 1:
-            return (self.B.value_shape()[0],)
-        else:
+        value_shapes = [e.value_shape() for e in self.factors]
+        if sum(len(vs) for vs in value_shapes) > 1:
             raise NotImplementedError("value_shape not implemented")
+        return sum(value_shapes, ())
 
     def dmats(self):
         """Return dmats: expansion coefficients for basis function
@@ -368,7 +418,185 @@ class TensorProductElement(FiniteElement):
 
     def is_nodal(self):
         # This element is nodal iff all factor elements are nodal.
-        return all([self.A.is_nodal(), self.B.is_nodal()])
+        return all(e.is_nodal() for e in self.factors)
+
+    def _fingerprint_data(self):
+        return super(TensorProductElement, self)._fingerprint_data() + self.factors
+
+
+class FactoredTable(object):
+    """Table of a tensor product element at tensor product points,
+    stored as the tables of the factor elements at the factor points.
+
+    The table described has shape ``(n_0*n_1*..., value_shape,
+    q_0*q_1*...)``, where ``n_i`` and ``q_i`` are the numbers of basis
+    functions and points of factor ``i``, both products being ordered
+    with the last factor varying fastest, and ``value_shape`` is the
+    concatenation of the value shapes of the factors.  Its entries are
+    products of one entry from each factor table.
+
+    :arg factors: The factor tables, of shapes ``(n_i, value_shape_i, q_i)``.
+    :arg value_shapes: The value shapes of the factors.
+    """
+
+    def __init__(self, factors, value_shapes):
+        self.factors = tuple(factors)
+        self.value_shapes = tuple(tuple(vs) for vs in value_shapes)
+        self.value_shape = sum(self.value_shapes, ())
+        self.shape = ((int(numpy.prod([len(f) for f in self.factors])),) +
+                      self.value_shape +
+                      (int(numpy.prod([f.shape[-1] for f in self.factors])),))
+
+    def __array__(self, dtype=None):
+        return self.to_array() if dtype is None else self.to_array().astype(dtype)
+
+    def to_array(self):
+        """Return the dense table, as from ``tabulate``."""
+        subscripts = _kronecker_subscripts(self.value_shapes, False)
+        return numpy.einsum(subscripts, *self.factors).reshape(self.shape)
+
+    def _axes(self):
+        """Return the positions of the value and the point axes in an
+        array with axes (value_shape_0, q_0, value_shape_1, q_1, ...)."""
+        value_axes = []
+        point_axes = []
+        offset = 0
+        for vs in self.value_shapes:
+            value_axes.extend(range(offset, offset + len(vs)))
+            point_axes.append(offset + len(vs))
+            offset += len(vs) + 1
+        return tuple(value_axes), tuple(point_axes)
+
+    def apply(self, coefficients):
+        """Return the values at the points of the function with the
+        given basis coefficients, contracting one factor at a time.
+
+        :arg coefficients: An array of shape ``(n_0*n_1*...,)``.
+        :returns: An array of shape ``value_shape + (q_0*q_1*...,)``.
+        """
+        u = numpy.reshape(coefficients, [len(f) for f in self.factors])
+        for f in self.factors:
+            u = numpy.tensordot(u, f, axes=(0, 0))
+        value_axes, point_axes = self._axes()
+        return u.transpose(value_axes + point_axes).reshape(self.shape[1:])
+
+    def apply_transpose(self, values):
+        """Return the integrals of the basis functions against values
+        at the points, contracting one factor at a time.  This is the
+        transpose of :meth:`apply`.
+
+        :arg values: An array of shape ``value_shape + (q_0*q_1*...,)``.
+        :returns: An array of shape ``(n_0*n_1*...,)``.
+        """
+        v = numpy.reshape(values, self.value_shape + tuple(f.shape[-1] for f in self.factors))
+        value_axes, point_axes = self._axes()
+        v = v.transpose(numpy.argsort(value_axes + point_axes))
+        for f in self.factors:
+            n = f.ndim - 1
+            v = numpy.tensordot(v, f, axes=(range(n), range(1, n + 1)))
+        return v.reshape(self.shape[0])
+
+
+class TensorProductOperator(object):
+    """Reference mass and stiffness operators of a tensor product
+    element, integrated with a tensor product quadrature rule and
+    applied by sum factorisation.
+
+    The operators are ``B^T D B`` with ``B`` the table of basis
+    functions (or of their derivatives) at the quadrature points and
+    ``D`` the quadrature weights times an optional coefficient.  They
+    are never assembled: ``B`` and ``B^T`` are applied one factor at a
+    time, which costs O(p^{d+1}) rather than O(p^{2d}) operations for
+    degree p in d dimensions.
+
+    :arg element: A :class:`TensorProductElement` or a
+        :class:`FlattenedDimensions` wrapping one.  The product must be
+        flat, so a hexahedral element is ``TensorProductElement(A, B,
+        C)`` rather than a product with a nested product factor.
+    :arg rule: A :class:`~FIAT.quadrature.TensorProductQuadratureRule`
+        with one factor rule per factor element.
+    """
+
+    def __init__(self, element, rule):
+        product = element.element if isinstance(element, FlattenedDimensions) else element
+        if not isinstance(product, TensorProductElement):
+            raise ValueError("TensorProductOperator needs a tensor product element")
+        if any(isinstance(e, (TensorProductElement, FlattenedDimensions)) for e in product.factors):
+            raise ValueError("TensorProductOperator needs a flat product, such as "
+                             "TensorProductElement(A, B, C), not one with product factors")
+        if len(getattr(rule, "factors", ())) != len(product.factors):
+            raise ValueError("TensorProductOperator needs a tensor product rule with "
+                             "one factor rule per factor element (%d)" % len(product.factors))
+        tables = element.tabulate_factored(1, rule)
+        sd = element.get_reference_element().get_spatial_dimension()
+        self.basis = tables[(0,) * sd]
+        self.gradient = [tables[tuple(int(i == j) for i in range(sd))]
+                         for j in range(sd)]
+        self.weights = rule.get_weights()
+
+    def mass(self, coefficients, coefficient=None):
+        """Return the action of the mass matrix.
+
+        :arg coefficients: The basis coefficients of the argument.
+        :arg coefficient: Optional values of a scalar coefficient at
+            the quadrature points.
+        """
+        weights = self._weights(coefficient)
+        return self.basis.apply_transpose(self.basis.apply(coefficients) * weights)
+
+    def stiffness(self, coefficients, coefficient=None):
+        """Return the action of the stiffness matrix, the integral of
+        ``dot(K grad(u), grad(v))``.
+
+        :arg coefficients: The basis coefficients of the argument.
+        :arg coefficient: Optional values of ``K`` at the quadrature
+            points, either scalar, of shape ``(npoints,)``, or
+            tensor-valued, of shape ``(sd, sd, npoints)``.
+        """
+        grad = [g.apply(coefficients) for g in self.gradient]
+        if numpy.ndim(coefficient) == 3:
+            weights = self.weights
+            grad = [sum(k * g for k, g in zip(row, grad)) for row in coefficient]
+        else:
+            weights = self._weights(coefficient)
+        return sum(g.apply_transpose(flux * weights)
+                   for g, flux in zip(self.gradient, grad))
+
+    def mass_diagonal(self, coefficient=None):
+        """Return the diagonal of the mass matrix, for Jacobi
+        smoothing.  See :meth:`mass` for the arguments."""
+        return self._diagonal(self.basis, self.basis, self._weights(coefficient))
+
+    def stiffness_diagonal(self, coefficient=None):
+        """Return the diagonal of the stiffness matrix, for Jacobi
+        smoothing.  See :meth:`stiffness` for the arguments."""
+        if numpy.ndim(coefficient) == 3:
+            return sum(self._diagonal(gi, gj, self.weights * coefficient[i][j])
+                       for i, gi in enumerate(self.gradient)
+                       for j, gj in enumerate(self.gradient))
+        weights = self._weights(coefficient)
+        return sum(self._diagonal(g, g, weights) for g in self.gradient)
+
+    def _weights(self, coefficient):
+        if coefficient is None:
+            return self.weights
+        return self.weights * coefficient
+
+    def _diagonal(self, left, right, weights):
+        # The entrywise product of two factored tables is factored as well
+        product = FactoredTable([a * b for a, b in zip(left.factors, right.factors)],
+                                left.value_shapes)
+        return product.apply_transpose(numpy.broadcast_to(weights, product.shape[1:]))
+
+
+def materialise(tables):
+    """Convert the result of ``tabulate_factored`` to the dense format
+    returned by ``tabulate``.
+
+    :arg tables: A dict of :class:`FactoredTable` objects.
+    :returns: A dict of arrays with the same keys.
+    """
+    return {alpha: table.to_array() for alpha, table in tables.items()}
 
 
 class FlattenedDimensions(FiniteElement):
@@ -417,6 +645,15 @@ class FlattenedDimensions(FiniteElement):
 
         return self.element.tabulate(order, points, product_entity)
 
+    def tabulate_factored(self, order, points, entity=None):
+        """Return tabulated values of derivatives up to given order of
+        basis functions at tensor product points, as
+        :class:`FactoredTable` objects."""
+        if entity is None:
+            entity = (self.get_reference_element().get_spatial_dimension(), 0)
+        product_entity = self.unflattening_map[tuple(entity)]
+        return self.element.tabulate_factored(order, points, product_entity)
+
     def value_shape(self):
         """Return the value shape of the finite element functions."""
         return self.element.value_shape()
@@ -443,3 +680,6 @@ class FlattenedDimensions(FiniteElement):
     def is_nodal(self):
         # This element is nodal iff unflattened element is nodal.
         return self.element.is_nodal()
+
+    def _fingerprint_data(self):
+        return super(FlattenedDimensions, self)._fingerprint_data() + (self.element,)
@@ -27,4 +27,5 @@ setup(name="fenics-fiat",
       download_url=tarball,
       license="LGPL v3 or later",
       packages=["FIAT"],
+      package_data={"FIAT": ["quadrature_data/*"]},
       install_requires=["numpy", "sympy"])
@@ -0,0 +1,67 @@
+# Copyright (C) 2018 Imperial College London and others
+#
+# This file is part of FIAT.
+#
+# FIAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FIAT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with FIAT. If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from FIAT.reference_element import UFCInterval, UFCTriangle, UFCTetrahedron
+from FIAT.lagrange import Lagrange
+from FIAT.discontinuous_lagrange import DiscontinuousLagrange
+from FIAT.tensor_product import TensorProductElement
+
+
+@pytest.fixture(params=["P3 triangle", "P2 tetrahedron", "P2 x DG1"])
+def element(request):
+    if request.param == "P3 triangle":
+        return Lagrange(UFCTriangle(), 3)
+    elif request.param == "P2 tetrahedron":
+        return Lagrange(UFCTetrahedron(), 2)
+    else:
+        return TensorProductElement(Lagrange(UFCTriangle(), 2),
+                                    DiscontinuousLagrange(UFCInterval(), 1))
+
+
+def test_entity_closure_ids(element):
+    dual = element.get_dual_set()
+    ref_el = element.get_reference_element()
+    entity_ids = dual.get_entity_ids()
+    closure_ids = dual.get_entity_closure_ids()
+    for dim, entities in ref_el.sub_entities.items():
+        for e, sub_entities in entities.items():
+            expected = sorted(dof for d, se in sub_entities
+                              for dof in entity_ids[d][se])
+            assert closure_ids[dim][e] == expected
+
+
+@pytest.mark.parametrize("closure", [False, True])
+def test_entity_ids_csr(element, closure):
+    dual = element.get_dual_set()
+    if closure:
+        mapping = dual.get_entity_closure_ids()
+        csr = dual.get_entity_closure_ids_csr()
+    else:
+        mapping = dual.get_entity_ids()
+        csr = dual.get_entity_ids_csr()
+    assert set(csr) == set(mapping)
+    for dim, (offsets, ids) in csr.items():
+        assert len(offsets) == len(mapping[dim]) + 1
+        for e, dofs in mapping[dim].items():
+            assert list(ids[offsets[e]:offsets[e + 1]]) == list(dofs)
+
+
+if __name__ == '__main__':
+    import os
+    pytest.main(os.path.abspath(__file__))
@@ -43,7 +43,7 @@ from FIAT.tensor_product import TensorProductElement            # noqa: F401
 from FIAT.tensor_product import FlattenedDimensions             # noqa: F401
 from FIAT.hdivcurl import Hdiv, Hcurl                           # noqa: F401
 from FIAT.argyris import Argyris, QuinticArgyris                # noqa: F401
-from FIAT.hermite import CubicHermite                           # noqa: F401
+from FIAT.hermite import CubicHermite
 from FIAT.morley import Morley                                  # noqa: F401
 from FIAT.bubble import Bubble
 from FIAT.enriched import EnrichedElement                       # noqa: F401
@@ -324,6 +324,50 @@ def test_nodal_enriched_implementation():
                        e1.get_dual_set().to_riesz(e1.get_nodal_basis()))
 
 
+@pytest.mark.parametrize('elements', [
+    (Lagrange(T, 1), Bubble(T, 3)),
+    (Bubble(T, 3), Lagrange(T, 2)),
+    (Lagrange(S, 2), Bubble(S, 4)),
+    (RestrictedElement(RaviartThomas(T, 3), restriction_domain='facet'),
+     RestrictedElement(RaviartThomas(T, 3), restriction_domain='interior')),
+    (CubicHermite(I), RestrictedElement(Lagrange(I, 4), indices=[3])),
+])
+def test_nodal_enriched_vandermonde(elements):
+    """Check that the block-eliminated nodal basis matches inverting
+    the full generalized Vandermonde matrix
+    """
+    from FIAT.finite_element import CiarletElement
+    from FIAT.polynomial_set import PolynomialSet
+    from FIAT.nodal_enriched import _merge_coeffs
+
+    e = NodalEnrichedElement(*elements)
+    ps = e.get_nodal_basis()
+    coeffs = _merge_coeffs([x.get_coeffs() for x in elements])
+    poly_set = PolynomialSet(ps.get_reference_element(), ps.get_degree(),
+                             ps.get_embedded_degree(), ps.get_expansion_set(),
+                             coeffs, ps.get_dmats())
+    expected = CiarletElement(poly_set, e.get_dual_set(), e.get_order())
+    assert np.allclose(e.V, expected.V)
+    assert np.allclose(e.get_coeffs(), expected.get_coeffs())
+
+
+def test_restricted_unsorted_indices():
+    element = RestrictedElement(Lagrange(T, 3), indices=[9, 0, 4, 7])
+    assert element.space_dimension() == 4
+    points = [list(n.get_point_dict().keys())[0] for n in element.dual_basis()]
+    vals = element.tabulate(0, points)[(0, 0)]
+    assert np.allclose(vals, np.eye(4))
+
+
+@pytest.mark.parametrize('element', [
+    TensorProductElement(Lagrange(I, 1), Lagrange(I, 1)),
+    MixedElement([Lagrange(T, 1), Lagrange(T, 1)]),
+])
+def test_restricted_without_nodal_basis(element):
+    with pytest.raises(NotImplementedError):
+        RestrictedElement(element, indices=[0])
+
+
 def test_mixed_is_nodal():
     element = MixedElement([DiscontinuousLagrange(T, 1), RaviartThomas(T, 2)])
 
@@ -342,6 +386,90 @@ def test_mixed_is_not_nodal():
     assert not element.is_nodal()
 
 
+def test_mixed_repeated_tabulate():
+    P2 = Lagrange(T, 2)
+    RT = RaviartThomas(T, 2)
+    elements = [P2, RT, Lagrange(T, 2), DiscontinuousLagrange(T, 1), P2]
+    element = MixedElement(elements)
+    assert [indices for e, indices in element._distinct_elements()] == [[0, 2, 4], [1], [3]]
+
+    # Identical objects are only fingerprinted once
+    calls = []
+    for e in (P2, RT):
+        def fingerprint(fingerprint=e.fingerprint):
+            calls.append(fingerprint())
+            return calls[-1]
+        e.fingerprint = fingerprint
+    assert len(MixedElement([P2, P2, P2])._distinct_elements()) == 1
+    assert calls == []
+    assert len(MixedElement([P2, RT, P2, RT])._distinct_elements()) == 2
+    assert sorted(calls) == sorted([P2._fingerprint, RT._fingerprint])
+
+    points = np.random.RandomState(0).rand(4, 2) / 2
+    tab = element.tabulate(1, points)
+    rows = np.cumsum([0] + [e.space_dimension() for e in elements])
+    cols = np.cumsum([0] + [int(np.prod(e.value_shape())) for e in elements])
+    for alpha, vals in tab.items():
+        expected = np.zeros_like(vals)
+        for i, e in enumerate(elements):
+            block = e.tabulate(1, points)[alpha]
+            expected[rows[i]:rows[i+1], cols[i]:cols[i+1]] = block.reshape(len(block), -1, len(points))
+        assert np.array_equal(vals, expected)
+
+
+@pytest.mark.parametrize('element', [
+    "Lagrange(S, 3)",
+    "RaviartThomas(T, 2)",
+    "MixedElement([Lagrange(T, 2), RaviartThomas(T, 1)])",
+    "TensorProductElement(Lagrange(I, 2), Lagrange(I, 1))",
+])
+def test_iter_tabulate(element):
+    element = eval(element)
+    sd = element.get_reference_element().get_spatial_dimension()
+    points = np.random.RandomState(0).rand(23, sd) / sd
+    expected = element.tabulate(1, points)
+    out = {alpha: np.empty(vals.shape[:-1] + (5,)) for alpha, vals in expected.items()}
+
+    for buffers in [None, out]:
+        stops = []
+        for s, tables in element.iter_tabulate(1, points, chunk=5, out=buffers):
+            stops.append(s.stop)
+            assert set(tables) == set(expected)
+            for alpha, vals in tables.items():
+                assert np.allclose(vals, expected[alpha][..., s])
+                if buffers is not None:
+                    assert np.shares_memory(vals, buffers[alpha])
+        assert stops == [5, 10, 15, 20, 23]
+
+    # Bad keys, too short for the chunk, wrong shape
+    with pytest.raises(ValueError):
+        element.iter_tabulate(0, points, chunk=5, out=out)
+    with pytest.raises(ValueError):
+        element.iter_tabulate(1, points, chunk=6, out=out)
+    with pytest.raises(ValueError):
+        element.iter_tabulate(1, points, chunk=5,
+                              out={alpha: vals[:-1] for alpha, vals in out.items()})
+
+
+def test_tabulate_into_memmap(tmpdir):
+    element = RaviartThomas(T, 2)
+    points = np.random.RandomState(0).rand(50, 2) / 2
+    np.save(str(tmpdir.join("points.npy")), points)
+    points = np.load(str(tmpdir.join("points.npy")), mmap_mode="r")
+    out = np.lib.format.open_memmap(str(tmpdir.join("tables.npy")), mode="w+",
+                                    shape=(6, element.space_dimension(), 2, 50))
+
+    alphas = element.tabulate_into(2, points, out, tile=16)
+    expected = element.tabulate(2, points)
+    assert sorted(alphas) == sorted(expected)
+    tables = np.load(str(tmpdir.join("tables.npy")))
+    for i, alpha in enumerate(alphas):
+        assert np.allclose(tables[i], expected[alpha])
+
+    with pytest.raises(ValueError):
+        element.tabulate_into(1, points, out)
+
+
 @pytest.mark.parametrize('element', [
     "TensorProductElement(Lagrange(I, 1), Lagrange(I, 1))",
     "TensorProductElement(Lagrange(I, 2), Lagrange(I, 2))",
@@ -0,0 +1,99 @@
+# Copyright (C) 2018 Imperial College London and others
+#
+# This file is part of FIAT.
+#
+# FIAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FIAT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with FIAT. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from FIAT.reference_element import UFCInterval, UFCTriangle, DefaultTriangle, TensorProductCell
+from FIAT.lagrange import Lagrange
+from FIAT.discontinuous_lagrange import DiscontinuousLagrange
+from FIAT.raviart_thomas import RaviartThomas
+from FIAT.discontinuous import DiscontinuousElement
+from FIAT.mixed import MixedElement
+from FIAT.tensor_product import TensorProductElement
+from FIAT.hdivcurl import Hdiv, Hcurl
+from FIAT.quadrature import QuadratureRule
+from FIAT.quadrature_schemes import create_quadrature
+
+
+I = UFCInterval()  # noqa: E741
+T = UFCTriangle()
+
+
+def elements():
+    P1 = Lagrange(I, 1)
+    DG0 = DiscontinuousLagrange(I, 0)
+    return [Lagrange(T, 1),
+            Lagrange(T, 2),
+            Lagrange(DefaultTriangle(), 2),
+            DiscontinuousLagrange(T, 2),
+            DiscontinuousElement(Lagrange(T, 2)),
+            RaviartThomas(T, 1),
+            MixedElement([Lagrange(T, 2), Lagrange(T, 1)]),
+            MixedElement([Lagrange(T, 1), Lagrange(T, 2)]),
+            TensorProductElement(P1, DG0),
+            Hdiv(TensorProductElement(P1, DG0)),
+            Hcurl(TensorProductElement(DG0, P1))]
+
+
+def test_fingerprint_equal():
+    for a, b in zip(elements(), elements()):
+        assert a is not b
+        assert a.fingerprint() == b.fingerprint()
+
+
+def test_fingerprint_distinct():
+    fingerprints = [e.fingerprint() for e in elements()]
+    assert len(set(fingerprints)) == len(fingerprints)
+
+
+def test_hdiv_does_not_inherit_fingerprint():
+    elt = TensorProductElement(Lagrange(I, 1), DiscontinuousLagrange(I, 0))
+    fingerprint = elt.fingerprint()
+    assert Hdiv(elt).fingerprint() != fingerprint
+    assert elt.fingerprint() == fingerprint
+
+
+def test_quadrature_fingerprint():
+    assert create_quadrature(T, 3).fingerprint() == create_quadrature(T, 3).fingerprint()
+    assert create_quadrature(T, 3).fingerprint() != create_quadrature(T, 4).fingerprint()
+    assert create_quadrature(T, 3).fingerprint() != create_quadrature(T, 3, "canonical").fingerprint()
+
+    # Only the cell, points and weights count, not the class of the rule
+    for q in [create_quadrature(T, 30), create_quadrature(TensorProductCell(I, I), 3)]:
+        assert type(q) is not QuadratureRule
+        assert QuadratureRule(q.ref_el, q.get_points(), q.get_weights()).fingerprint() == q.fingerprint()
+
+
+@pytest.mark.parametrize("hashseed", ["1", "2"])
+def test_fingerprint_stable_across_processes(hashseed):
+    code = ("from FIAT.reference_element import UFCTriangle;"
+            "from FIAT.raviart_thomas import RaviartThomas;"
+            "from FIAT.quadrature_schemes import create_quadrature;"
+            "print(RaviartThomas(UFCTriangle(), 2).fingerprint());"
+            "print(create_quadrature(UFCTriangle(), 5).fingerprint())")
+    env = dict(os.environ, PYTHONHASHSEED=hashseed)
+    output = subprocess.check_output([sys.executable, "-c", code], env=env)
+    assert output.decode().split() == [RaviartThomas(T, 2).fingerprint(),
+                                       create_quadrature(T, 5).fingerprint()]
+
+
+if __name__ == '__main__':
+    pytest.main(os.path.abspath(__file__))
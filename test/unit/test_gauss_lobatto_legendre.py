@@ -42,6 +42,39 @@ def test_gll_basis_values(degree):
         assert np.allclose(integral, reference, rtol=1e-14)
 
 
+@pytest.mark.parametrize("degree", range(1, 7))
+@pytest.mark.parametrize("cell", ["interval", "quadrilateral", "hexahedron"])
+def test_gll_collocated_mass(cell, degree):
+    """Check that the GLL element and its tensor products have a
+    diagonal mass matrix with the GLL quadrature rule."""
+    from FIAT import ufc_simplex, GaussLobattoLegendre, TensorProductElement, create_quadrature
+    from FIAT.reference_element import UFCQuadrilateral, UFCHexahedron
+    from FIAT.tensor_product import FlattenedDimensions
+    from FIAT.finite_element import collocation_mass_diagonal
+
+    s = ufc_simplex(1)
+    fe = GaussLobattoLegendre(s, degree)
+    if cell == "interval":
+        ref_el = s
+    elif cell == "quadrilateral":
+        ref_el = UFCQuadrilateral()
+        fe = FlattenedDimensions(TensorProductElement(fe, fe))
+    else:
+        ref_el = UFCHexahedron()
+        fe = FlattenedDimensions(TensorProductElement(TensorProductElement(fe, fe), fe))
+
+    q = create_quadrature(ref_el, 2 * degree - 1, "GLL")
+    assert len(q.get_weights()) == (degree + 1) ** ref_el.get_spatial_dimension()
+
+    diagonal = collocation_mass_diagonal(fe, q)
+    tab = fe.tabulate(0, q.get_points())[(0,) * ref_el.get_spatial_dimension()]
+    mass = np.dot(tab * q.get_weights(), tab.T)
+    assert np.allclose(mass, np.diag(diagonal))
+
+    # Exact mass matrices are not diagonal
+    assert collocation_mass_diagonal(fe, create_quadrature(ref_el, 2 * degree)) is None
+
+
 if __name__ == '__main__':
     import os
     pytest.main(os.path.abspath(__file__))
@@ -0,0 +1,121 @@
+# Copyright (C) 2018 Imperial College London and others
+#
+# This file is part of FIAT.
+#
+# FIAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FIAT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with FIAT. If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+
+import numpy as np
+import pytest
+
+from FIAT import parallel
+from FIAT.reference_element import UFCTriangle, UFCTetrahedron
+from FIAT.lagrange import Lagrange
+from FIAT.raviart_thomas import RaviartThomas
+from FIAT.discontinuous_lagrange import DiscontinuousLagrange
+from FIAT.mixed import MixedElement
+from FIAT.enriched import EnrichedElement
+from FIAT.bubble import Bubble
+
+
+@pytest.fixture(autouse=True)
+def serial():
+    yield
+    parallel.set_num_threads(1)
+
+
+@pytest.fixture(params=["P4 tetrahedron", "RT2 x DG1", "P1 + B3"])
+def element(request):
+    if request.param == "P4 tetrahedron":
+        return Lagrange(UFCTetrahedron(), 4)
+    elif request.param == "RT2 x DG1":
+        return MixedElement([RaviartThomas(UFCTriangle(), 2),
+                             DiscontinuousLagrange(UFCTriangle(), 1)])
+    else:
+        return EnrichedElement(Lagrange(UFCTriangle(), 1), Bubble(UFCTriangle(), 3))
+
+
+def test_parallel_tabulate(element):
+    sd = element.get_reference_element().get_spatial_dimension()
+    points = np.random.RandomState(0).rand(1000, sd) / sd
+    expected = element.tabulate(1, points)
+
+    tables = []
+    for num_threads in [2, 3]:
+        parallel.set_num_threads(num_threads, chunk_size=64)
+        tables.append(element.tabulate(1, points))
+
+    # Bitwise independent of the number of threads
+    for alpha, vals in expected.items():
+        assert np.array_equal(tables[0][alpha], vals)
+        assert np.array_equal(tables[1][alpha], vals)
+
+
+def test_nested_parallel_map():
+    parallel.set_num_threads(2)
+
+    def inner(i):
+        thread = threading.current_thread()
+        return all(t is thread for t in parallel.parallel_map(lambda j: threading.current_thread(),
+                                                              range(4)))
+
+    assert all(parallel.parallel_map(inner, range(4)))
+
+
+def test_set_num_threads():
+    assert parallel.get_num_threads() == 1
+    assert parallel.chunks(10) is None
+    parallel.set_num_threads(4, chunk_size=4)
+    assert parallel.get_num_threads() == 4
+    assert parallel.chunks(10) == [slice(0, 4), slice(4, 8), slice(8, 10)]
+    with pytest.raises(ValueError):
+        parallel.set_num_threads(0)
+
+
+def test_set_num_threads_waits():
+    parallel.set_num_threads(2)
+    started = threading.Barrier(3)
+    release = threading.Event()
+    results = []
+
+    def work(i):
+        started.wait()
+        release.wait()
+        return i
+
+    mapper = threading.Thread(target=lambda: results.extend(parallel.parallel_map(work, range(2))))
+    mapper.start()
+    started.wait()
+    setter = threading.Thread(target=parallel.set_num_threads, args=(3,))
+    setter.start()
+    setter.join(0.1)
+    # The pool is still in use, so it is not replaced yet
+    assert setter.is_alive()
+    release.set()
+    setter.join()
+    mapper.join()
+    assert results == [0, 1]
+    assert parallel.get_num_threads() == 3
+
+
+def test_set_num_threads_in_worker():
+    parallel.set_num_threads(2)
+    with pytest.raises(RuntimeError):
+        parallel.parallel_map(lambda i: parallel.set_num_threads(1), range(2))
+
+
+if __name__ == '__main__':
+    import os
+    pytest.main(os.path.abspath(__file__))
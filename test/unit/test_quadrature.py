@@ -20,6 +20,7 @@
 import numpy
 import pytest
 import FIAT
+from FIAT import reference_element
 from FIAT.reference_element import UFCInterval, UFCTriangle, UFCTetrahedron
 from FIAT.reference_element import UFCQuadrilateral, UFCHexahedron, TensorProductCell
 
@@ -183,6 +184,238 @@ def test_gauss_legendre_quadrature(interval, points, degree):
     assert numpy.round(q.integrate(lambda x: x[0]**degree) - 1./(degree+1), 14) == 0.
 
 
+@pytest.mark.parametrize(("a, points"), ((a, p)
+                                         for a in (0, 1, 2)
+                                         for p in (1, 2, 5, 20, 50)))
+def test_gauss_jacobi_rule(a, points):
+    """Check that the Gauss-Jacobi rule with weight (1-x)^a integrates
+    polynomials up to degree 2*points - 1 exactly."""
+    from FIAT.quadrature import compute_gauss_jacobi_rule
+    xs, ws = compute_gauss_jacobi_rule(a, 0, points)
+    assert numpy.all(numpy.diff(xs) > 0)
+    assert not ws.flags.writeable
+    assert compute_gauss_jacobi_rule(a, 0., points)[0] is xs
+
+    ref_x, ref_w = numpy.polynomial.legendre.leggauss(2 * points + a)
+    for degree in range(2 * points):
+        exact = numpy.dot(ref_w, (1 - ref_x)**a * ref_x**degree)
+        assert numpy.allclose(numpy.dot(ws, xs**degree), exact, rtol=1e-13, atol=1e-13)
+
+
+@pytest.mark.parametrize("points", (200, 1500))
+def test_gauss_jacobi_rule_many_points(points):
+    """Check the rules for large numbers of points, which start from
+    asymptotic approximations of the nodes."""
+    from FIAT.quadrature import compute_gauss_jacobi_rule
+    xs, ws = compute_gauss_jacobi_rule(0, 0, points)
+    ref_x, ref_w = numpy.polynomial.legendre.leggauss(points)
+    assert numpy.allclose(xs, ref_x, rtol=0, atol=1e-14)
+    assert numpy.allclose(ws, ref_w, rtol=1e-8, atol=0)
+    assert numpy.allclose(sum(ws), 2, rtol=1e-14)
+
+    xs, ws = compute_gauss_jacobi_rule(2, 0, points)
+    for degree in range(5):
+        exact = numpy.dot(ref_w, (1 - ref_x)**2 * ref_x**degree)
+        assert numpy.allclose(numpy.dot(ws, xs**degree), exact, rtol=1e-12, atol=1e-14)
+
+
+def test_quadrature_rules_cached(triangle, extr_triangle, scheme):
+    q = FIAT.create_quadrature(triangle, 5, scheme)
+    assert FIAT.create_quadrature(UFCTriangle(), 5, scheme) is q
+    assert FIAT.create_quadrature(triangle, 6, scheme) is not q
+    assert FIAT.create_quadrature(extr_triangle, (5, 2), scheme) is \
+        FIAT.create_quadrature(extr_triangle, [5, 2], scheme)
+    assert FIAT.make_quadrature(triangle, 3) is FIAT.make_quadrature(UFCTriangle(), 3)
+
+    assert q.get_points() is q.get_points()
+    assert q.get_points().flags.c_contiguous
+    assert not q.get_points().flags.writeable
+    assert not q.get_weights().flags.writeable
+
+
+def test_quadrature_cache_limit(monkeypatch):
+    from FIAT import quadrature
+    monkeypatch.setattr(quadrature, "_MAX_RULES", 2)
+
+    @quadrature.memoize_on_cell
+    def rule(ref_el, m):
+        return object()
+
+    T = UFCTriangle()
+    q = rule(T, 1)
+    rule(T, 2)
+    assert rule(T, 1) is q
+    # Now m = 2 is the least recently used rule, and is dropped
+    q3 = rule(T, 3)
+    assert rule(T, 1) is q
+    assert rule(T, 3) is q3
+    rule(T, 4)
+    assert rule(T, 1) is not q
+
+
+def test_integrate_vectorized(triangle):
+    q = FIAT.create_quadrature(triangle, 4)
+    f = lambda x: x[0]**2 * x[1]
+    expected = q.integrate(f)
+    assert numpy.allclose(expected, 1./60)
+    assert numpy.allclose(q.integrate(lambda X: X[:, 0]**2 * X[:, 1], vectorized=True), expected)
+
+    # A batch of integrands: all products of the P2 basis functions
+    phi = FIAT.Lagrange(triangle, 2).tabulate(0, q.get_points())[(0, 0)]
+    values = numpy.einsum("ip,jp->pij", phi, phi)
+    mass = q.integrate(values)
+    assert mass.shape == (6, 6)
+    assert numpy.allclose(mass, mass.T)
+    assert numpy.allclose(mass.sum(), 0.5)
+
+    with pytest.raises(ValueError):
+        q.integrate(values[1:])
+
+
+def test_tensor_product_quadrature_factors(interval, triangle):
+    from FIAT.quadrature import TensorProductQuadratureRule
+    qa = FIAT.create_quadrature(triangle, 3)
+    qb = FIAT.create_quadrature(interval, 4)
+    q = FIAT.quadrature.make_tensor_product_quadrature(qa, qb)
+    assert isinstance(q, TensorProductQuadratureRule)
+    assert q.factors == (qa, qb)
+
+    pts = [numpy.concatenate([xa, xb]) for xa in qa.get_points() for xb in qb.get_points()]
+    wts = [wa * wb for wa in qa.get_weights() for wb in qb.get_weights()]
+    assert numpy.allclose(q.get_points(), pts)
+    assert numpy.allclose(q.get_weights(), wts)
+    assert not q.get_points().flags.writeable
+
+
+def _simplex_monomial_integral(alpha):
+    """Integral of prod x_i^alpha_i over the UFC simplex."""
+    from math import factorial
+    return numpy.prod([factorial(a) for a in alpha]) / factorial(sum(alpha) + len(alpha))
+
+
+@pytest.mark.parametrize(("cell, degree"), ((c, d)
+                                            for c in (UFCTriangle(), UFCTetrahedron())
+                                            for d in range(7, 21)))
+def test_symmetric_simplex_quadrature(cell, degree):
+    """Check that the tabulated rules are exact to their degree, with
+    positive weights, points in the cell and fewer points than the
+    collapsed rules."""
+    import itertools
+    q = FIAT.create_quadrature(cell, degree)
+    dim = cell.get_spatial_dimension()
+    pts, wts = q.get_points(), q.get_weights()
+    assert len(wts) < len(FIAT.create_quadrature(cell, degree, "canonical").get_weights())
+    assert numpy.all(wts > 0)
+    assert numpy.all(pts > -1e-15) and numpy.all(pts.sum(axis=1) < 1 + 1e-15)
+
+    for alpha in itertools.product(range(degree + 1), repeat=dim):
+        if sum(alpha) <= degree:
+            integral = q.integrate(numpy.prod(pts ** alpha, axis=1))
+            assert numpy.allclose(integral, _simplex_monomial_integral(alpha), rtol=1e-13, atol=1e-15)
+
+
+@pytest.mark.parametrize(("cell, degree"), ((c, d)
+                                            for c in (UFCQuadrilateral(), UFCHexahedron())
+                                            for d in range(22)))
+def test_symmetric_cube_quadrature(cell, degree):
+    """Check that the symmetric rules on quadrilaterals and hexahedra
+    are exact to their degree, with positive weights, points in the
+    cell and no more points than the Gauss rules."""
+    import itertools
+    q = FIAT.create_quadrature(cell, degree, "symmetric")
+    dim = cell.get_spatial_dimension()
+    pts, wts = q.get_points(), q.get_weights()
+    assert len(wts) <= len(FIAT.create_quadrature(cell, degree).get_weights())
+    assert numpy.all(wts > 0)
+    assert numpy.all(pts >= 0) and numpy.all(pts <= 1)
+
+    for alpha in itertools.product(range(degree + 1), repeat=dim):
+        if sum(alpha) <= degree:
+            integral = q.integrate(numpy.prod(pts ** alpha, axis=1))
+            exact = 1. / numpy.prod([a + 1 for a in alpha])
+            assert numpy.allclose(integral, exact, rtol=1e-13, atol=1e-15)
+
+
+@pytest.mark.parametrize(("cell, degree"), ((c, d)
+                                            for c in (reference_element.DefaultTriangle(),
+                                                      reference_element.IntrepidTriangle(),
+                                                      reference_element.DefaultTetrahedron(),
+                                                      reference_element.IntrepidTetrahedron())
+                                            for d in (2, 4, 9)))
+def test_mapped_simplex_quadrature(cell, degree):
+    """Check that other simplices get the UFC rules, mapped affinely."""
+    ufc = reference_element.ufc_simplex(cell.get_spatial_dimension())
+    q = FIAT.create_quadrature(cell, degree)
+    assert q.ref_el is cell
+    assert len(q.get_weights()) == len(FIAT.create_quadrature(ufc, degree).get_weights())
+    assert numpy.allclose(q.get_weights().sum(), cell.volume())
+
+    # Integrate a polynomial of the given degree
+    A, b = reference_element.make_affine_mapping(cell.get_vertices(), ufc.get_vertices())
+    f = lambda x: numpy.dot(A, x) + b
+    integral = q.integrate(lambda x: numpy.prod(f(x)) ** (degree // len(x)))
+    exact = FIAT.create_quadrature(ufc, degree, "canonical").integrate(
+        lambda x: numpy.prod(x) ** (degree // len(x)))
+    assert numpy.allclose(integral, exact * abs(numpy.linalg.det(numpy.linalg.inv(A))))
+
+
+@pytest.mark.parametrize("degree", range(8))
+def test_create_gll_quadrature(interval, quadrilateral, hexahedron, degree):
+    q = FIAT.create_quadrature(interval, degree, "GLL")
+    assert numpy.allclose(q.get_points()[[0, -1]], [[0], [1]])
+    assert numpy.allclose(q.integrate(lambda x: x[0]**degree), 1. / (degree + 1))
+
+    for cell in (quadrilateral, hexahedron):
+        q = FIAT.create_quadrature(cell, degree, "GLL")
+        assert numpy.allclose(q.integrate(lambda x: numpy.prod(x)**degree),
+                              (1. / (degree + 1))**cell.get_spatial_dimension())
+
+
+def test_entity_quadrature(tetrahedron, quadrilateral, extr_triangle):
+    from FIAT.quadrature_schemes import create_entity_quadrature
+
+    q = create_entity_quadrature(tetrahedron, 2, 3)
+    assert q is create_entity_quadrature(UFCTetrahedron(), 2, 3)
+    assert q.points.shape == (4, len(q.reference_rule.get_weights()), 3)
+    assert not q.points.flags.writeable
+    for f in range(4):
+        transform = tetrahedron.get_entity_transform(2, f)
+        assert numpy.allclose(q.points[f], list(map(transform, q.reference_rule.get_points())))
+        assert numpy.allclose(q.weights[f].sum(), tetrahedron.volume_of_subcomplex(2, f))
+        assert numpy.allclose(q.normals[f], tetrahedron.compute_reference_normal(2, f))
+    assert create_entity_quadrature(tetrahedron, 1, 3).normals is None
+
+    q = create_entity_quadrature(quadrilateral, 1, 2)
+    assert q.points.shape[:2] == (4, 2)
+    assert numpy.allclose(q.weights.sum(axis=1), 1)
+    for f in range(4):
+        x = q.points[f]
+        assert numpy.allclose(numpy.dot(x - x[0], q.normals[f]), 0)
+
+    q = create_entity_quadrature(extr_triangle, (1, 1), 2)
+    assert q.points.shape[0] == 3
+    assert numpy.allclose(q.weights.sum(axis=1), [numpy.sqrt(2), 1, 1])
+
+    q = create_entity_quadrature(tetrahedron, 0, 3, scheme="default")
+    assert q is create_entity_quadrature(tetrahedron, 0, 3, scheme="default")
+    assert numpy.allclose(q.points[:, 0, :], tetrahedron.get_vertices())
+    assert numpy.allclose(q.weights, 1)
+    assert q.normals is None
+
+    q = create_entity_quadrature(extr_triangle, (0, 0), 2)
+    assert numpy.allclose(q.points[:, 0, :], extr_triangle.get_vertices())
+
+
+def test_entity_support_dofs_vertices():
+    from FIAT.finite_element import entity_support_dofs
+    from FIAT.lagrange import Lagrange
+    from FIAT.tensor_product import TensorProductElement
+
+    assert entity_support_dofs(Lagrange(UFCTriangle(), 2), 0) == {0: [0], 1: [1], 2: [2]}
+    elem = TensorProductElement(Lagrange(UFCTriangle(), 1), Lagrange(UFCInterval(), 1))
+    assert entity_support_dofs(elem, (0, 0)) == {i: [i] for i in range(6)}
+
+
 if __name__ == '__main__':
     import os
     pytest.main(os.path.abspath(__file__))
@@ -0,0 +1,139 @@
+# Copyright (C) 2018 Imperial College London and others
+#
+# This file is part of FIAT.
+#
+# FIAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FIAT is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with FIAT. If not, see <http://www.gnu.org/licenses/>.
+
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from FIAT import shared_tables
+from FIAT.reference_element import UFCInterval, UFCTriangle
+from FIAT.lagrange import Lagrange
+from FIAT.raviart_thomas import RaviartThomas
+from FIAT.tensor_product import TensorProductElement
+
+pytest.importorskip("multiprocessing.shared_memory")
+
+
+@pytest.fixture(autouse=True)
+def release():
+    yield
+    shared_tables.release()
+
+
+def test_share_element():
+    element = RaviartThomas(UFCTriangle(), 3)
+    points = [(0.1, 0.2), (0.7, 0.1), (0.3, 0.3)]
+    expected = element.tabulate(1, points)
+
+    shared_tables.share_element(element)
+    assert not element.get_coeffs().flags.writeable
+    for alpha, table in element.tabulate(1, points).items():
+        assert np.allclose(table, expected[alpha])
+
+
+def test_share_tensor_product_element():
+    I = UFCInterval()  # noqa: E741
+    element = TensorProductElement(Lagrange(I, 2), Lagrange(I, 3))
+    shared_tables.share_element(element)
+    assert not element.A.get_coeffs().flags.writeable
+    assert not element.B.get_coeffs().flags.writeable
+
+
+def test_tabulate_across_processes():
+    element = Lagrange(UFCTriangle(), 4)
+    points = np.random.rand(20, 2) / 2
+    table = shared_tables.tabulate(element, 1, points)
+    for alpha, vals in element.tabulate(1, points).items():
+        assert np.allclose(table[alpha], vals)
+        assert not table[alpha].flags.writeable
+
+    # Another process attaches to the same tables
+    code = ("import sys, numpy;"
+            "from FIAT import shared_tables;"
+            "from FIAT.lagrange import Lagrange;"
+            "from FIAT.reference_element import UFCTriangle;"
+            "points = numpy.array(%r);"
+            "element = Lagrange(UFCTriangle(), 4);"
+            # Attaching must not tabulate again
+            "element.tabulate = None;"
+            "table = shared_tables.tabulate(element, 1, points);"
+            "assert not shared_tables._owned;"
+            "print(repr(float(table[(1, 0)].sum())))" % points.tolist())
+    output = subprocess.check_output([sys.executable, "-c", code])
+    assert float(output) == float(table[(1, 0)].sum())
+
+    # which are still there after it exits
+    assert shared_tables.tabulate(element, 1, points)[(0, 0)].base is not None
+
+
+def test_table_limit(monkeypatch):
+    from multiprocessing import shared_memory
+    monkeypatch.setattr(shared_tables, "_MAX_TABLES", 2)
+    element = Lagrange(UFCTriangle(), 2)
+    names = []
+    tables = []
+    for i in range(3):
+        tables.append(shared_tables.tabulate(element, 0, [(0.1 * i, 0.2)]))
+        names.append(next(reversed(shared_tables._tables)))
+    # Tables which are still referenced are not evicted
+    assert list(shared_tables._tables) == names
+    expected = tables[0][(0, 0)].copy()
+
+    del tables[:2]
+    shared_tables.tabulate(element, 0, [(0.1, 0.2)])
+    # The least recently used table was closed and unlinked
+    assert list(shared_tables._tables) == names[2:] + names[1:2]
+    assert names[0] not in shared_tables._segments
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(names[0])
+    assert np.array_equal(shared_tables.tabulate(element, 0, [(0.0, 0.2)])[(0, 0)], expected)
+
+
+def test_release_with_live_views():
+    element = Lagrange(UFCTriangle(), 2)
+    table = shared_tables.tabulate(element, 0, [(0.1, 0.2), (0.3, 0.3)])
+    view = table[(0, 0)][1:]
+    expected = view.copy()
+    del table
+    shared_tables.release()
+    # The segment stays mapped while arrays viewing it are alive
+    assert not shared_tables._segments and not shared_tables._owned
+    assert len(shared_tables._pending) == 1
+    assert np.array_equal(view, expected)
+
+    del view
+    shared_tables.release()
+    assert shared_tables._pending == []
+
+
+def test_unlink_at_exit():
+    from multiprocessing import shared_memory
+    code = ("from FIAT import shared_tables;"
+            "from FIAT.lagrange import Lagrange;"
+            "from FIAT.reference_element import UFCTriangle;"
+            "shared_tables.tabulate(Lagrange(UFCTriangle(), 1), 0, [(0.25, 0.5)]);"
+            "print(*shared_tables._owned)")
+    name, = subprocess.check_output([sys.executable, "-c", code]).decode().split()
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name)
+
+
+if __name__ == '__main__':
+    import os
+    pytest.main(os.path.abspath(__file__))
@@ -22,12 +22,13 @@
 import pytest
 import numpy as np
 
-from FIAT.reference_element import UFCInterval, UFCTriangle
+from FIAT.reference_element import UFCInterval, UFCTriangle, UFCTetrahedron, UFCHexahedron
 from FIAT.lagrange import Lagrange
 from FIAT.discontinuous_lagrange import DiscontinuousLagrange
 from FIAT.nedelec import Nedelec
 from FIAT.raviart_thomas import RaviartThomas
-from FIAT.tensor_product import TensorProductElement, FlattenedDimensions
+from FIAT.tensor_product import TensorProductElement, FlattenedDimensions, TensorProductOperator, materialise
+from FIAT.quadrature_schemes import create_quadrature
 from FIAT.hdivcurl import Hdiv, Hcurl
 from FIAT.enriched import EnrichedElement
 
@@ -560,6 +561,227 @@ def test_flattened_against_tpe_hex():
         assert np.isclose(tpe_tab[dd][7][0], flattened_tab[dd][7][0])
 
 
+def test_flattened_nary_against_nested_hex():
+    T = UFCInterval()
+    A, B, C = Lagrange(T, 2), Lagrange(T, 3), DiscontinuousLagrange(T, 1)
+    nary = FlattenedDimensions(TensorProductElement(A, B, C))
+    nested = FlattenedDimensions(TensorProductElement(FlattenedDimensions(TensorProductElement(A, B)), C))
+    assert nary.get_reference_element() == UFCHexahedron()
+    assert nary.entity_dofs() == nested.entity_dofs()
+    assert [n.get_point_dict() for n in nary.dual_basis()] == \
+        [n.get_point_dict() for n in nested.dual_basis()]
+
+    ref_el = nary.get_reference_element()
+    for dim in range(4):
+        points = create_quadrature(ref_el.construct_subelement(dim), 3).get_points()
+        for entity in ref_el.get_topology()[dim]:
+            tab = nary.tabulate(2, points, (dim, entity))
+            expected = nested.tabulate(2, points, (dim, entity))
+            assert set(tab) == set(expected)
+            for alpha in tab:
+                assert np.allclose(tab[alpha], expected[alpha])
+
+    rule = create_quadrature(ref_el, 4)
+    for alpha, table in materialise(nary.tabulate_factored(1, rule)).items():
+        assert np.allclose(table, nested.tabulate(1, rule.get_points())[alpha])
+
+
+# The placement of the product element's values, as (component,
+# source component, sign) triples, with None for scalar values
+@pytest.mark.parametrize("wrapper, A, B, placement",
+                         [(Hdiv, Lagrange(UFCInterval(), 2), DiscontinuousLagrange(UFCInterval(), 1),
+                           [(0, None, -1)]),
+                          (Hdiv, DiscontinuousLagrange(UFCInterval(), 1), Lagrange(UFCInterval(), 2),
+                           [(1, None, 1)]),
+                          (Hdiv, RaviartThomas(UFCTriangle(), 1), DiscontinuousLagrange(UFCInterval(), 0),
+                           [(0, 0, 1), (1, 1, 1)]),
+                          (Hdiv, Nedelec(UFCTriangle(), 1), DiscontinuousLagrange(UFCInterval(), 0),
+                           [(0, 1, 1), (1, 0, -1)]),
+                          (Hcurl, Lagrange(UFCInterval(), 2), DiscontinuousLagrange(UFCInterval(), 1),
+                           [(1, None, 1)]),
+                          (Hcurl, DiscontinuousLagrange(UFCInterval(), 1), Lagrange(UFCInterval(), 2),
+                           [(0, None, 1)]),
+                          (Hcurl, Nedelec(UFCTriangle(), 1), Lagrange(UFCInterval(), 1),
+                           [(0, 0, 1), (1, 1, 1)]),
+                          (Hcurl, RaviartThomas(UFCTriangle(), 1), Lagrange(UFCInterval(), 1),
+                           [(0, 1, -1), (1, 0, 1)])])
+def test_hdivcurl_tabulate_components(wrapper, A, B, placement):
+    elt = wrapper(TensorProductElement(A, B))
+    sd = elt.get_reference_element().get_spatial_dimension()
+    points = np.random.RandomState(0).rand(4, sd) / sd
+    old_tab = TensorProductElement(A, B).tabulate(1, points)
+    tab = elt.tabulate(1, points)
+    components = elt.tabulate_components(1, points)
+    for alpha, old in old_tab.items():
+        expected = np.zeros((len(old), sd, len(points)))
+        for c, source, sign in placement:
+            expected[:, c, :] = sign * (old if source is None else old[:, source, :])
+        assert np.array_equal(tab[alpha], expected)
+
+        table = components[alpha]
+        assert table.shape == expected.shape
+        assert np.array_equal(table.to_array(), expected)
+        assert sorted(table.components) == sorted(c for c, _, _ in placement)
+        assert table.block.shape[1] == len(placement)
+
+
+@pytest.mark.parametrize("wrapper", [Hdiv, Hcurl])
+def test_hdivcurl_nary(wrapper):
+    T = UFCInterval()
+    elt = TensorProductElement(DiscontinuousLagrange(T, 0), Lagrange(T, 1), Lagrange(T, 1))
+    with pytest.raises(NotImplementedError):
+        wrapper(elt)
+
+
+@pytest.mark.parametrize("wrapper", [Hdiv, Hcurl])
+def test_hdivcurl_leaves_element_untouched(wrapper):
+    T = UFCInterval()
+    elt = TensorProductElement(DiscontinuousLagrange(T, 1), Lagrange(T, 2))
+    nodes = list(elt.dual_basis())
+    tab = elt.tabulate(1, [(0.1, 0.2)])
+
+    wrapped = wrapper(elt)
+    assert wrapped.value_shape() == (2,)
+    assert wrapped.entity_dofs() == elt.entity_dofs()
+    assert all(n.get_type_tag() == "Undefined" for n in wrapped.dual_basis())
+
+    assert elt.value_shape() == ()
+    assert elt.mapping()[0] == "affine"
+    assert elt.dual_basis() == nodes
+    for alpha, vals in elt.tabulate(1, [(0.1, 0.2)]).items():
+        assert np.allclose(vals, tab[alpha])
+
+
+def test_TFE_3Dx1D_vector_tabulate():
+    A = RaviartThomas(UFCTetrahedron(), 1)
+    B = Lagrange(UFCInterval(), 2)
+    elt = TensorProductElement(A, B)
+    points = np.random.RandomState(0).rand(5, 4) / 4
+    tab = elt.tabulate(1, points)
+    Atab = A.tabulate(1, points[:, :3])
+    Btab = B.tabulate(1, points[:, 3:])
+    for alpha, vals in tab.items():
+        assert vals.shape == (A.space_dimension() * B.space_dimension(), 3, 5)
+        expected = [[Atab[alpha[:3]][i, :, :] * Btab[alpha[3:]][j, :]
+                     for j in range(B.space_dimension())]
+                    for i in range(A.space_dimension())]
+        assert np.allclose(vals, np.reshape(expected, vals.shape))
+
+
+@pytest.mark.parametrize("A, B", [(Lagrange(UFCInterval(), 3), DiscontinuousLagrange(UFCInterval(), 2)),
+                                  (RaviartThomas(UFCTriangle(), 2), Lagrange(UFCInterval(), 2))])
+def test_TFE_tabulate_factored(A, B):
+    elt = TensorProductElement(A, B)
+    rule = create_quadrature(elt.get_reference_element(), 4)
+    factored = elt.tabulate_factored(2, rule)
+    dense = elt.tabulate(2, rule.get_points())
+    assert set(factored) == set(dense)
+    for alpha, table in materialise(factored).items():
+        assert factored[alpha].shape == dense[alpha].shape
+        assert np.allclose(table, dense[alpha])
+
+
+@pytest.mark.parametrize("elt", [TensorProductElement(Lagrange(UFCInterval(), 3),
+                                                      DiscontinuousLagrange(UFCInterval(), 2)),
+                                 TensorProductElement(RaviartThomas(UFCTriangle(), 2),
+                                                      Lagrange(UFCInterval(), 2)),
+                                 FlattenedDimensions(TensorProductElement(Lagrange(UFCInterval(), 2),
+                                                                          Lagrange(UFCInterval(), 3),
+                                                                          Lagrange(UFCInterval(), 1)))])
+def test_TFE_operator(elt):
+    rule = create_quadrature(elt.get_reference_element(), 6)
+    operator = TensorProductOperator(elt, rule)
+
+    # Assemble the dense operators from the dense tables
+    sd = elt.get_reference_element().get_spatial_dimension()
+    weights = rule.get_weights()
+    npoints = len(weights)
+    tab = elt.tabulate(1, rule.get_points())
+    basis = tab[(0,) * sd].reshape(elt.space_dimension(), -1, npoints)
+    grad = [tab[tuple(int(i == j) for i in range(sd))].reshape(elt.space_dimension(), -1, npoints)
+            for j in range(sd)]
+    rs = np.random.RandomState(0)
+    c = 1 + rs.rand(npoints)
+    K = rs.rand(sd, sd, npoints)
+    M = np.einsum("icq,jcq,q->ij", basis, basis, weights * c)
+    S = sum(np.einsum("icq,jcq,q->ij", g, g, weights * c) for g in grad)
+    SK = sum(np.einsum("icq,jcq,q->ij", grad[a], grad[b], weights * K[a, b])
+             for a in range(sd) for b in range(sd))
+
+    u = rs.rand(elt.space_dimension())
+    assert np.allclose(operator.mass(u), np.einsum("icq,jcq,q->ij", basis, basis, weights).dot(u))
+    assert np.allclose(operator.mass(u, c), M.dot(u))
+    assert np.allclose(operator.stiffness(u, c), S.dot(u))
+    assert np.allclose(operator.stiffness(u, K), SK.dot(u))
+    assert np.allclose(operator.mass_diagonal(c), np.diag(M))
+    assert np.allclose(operator.stiffness_diagonal(c), np.diag(S))
+    assert np.allclose(operator.stiffness_diagonal(K), np.diag(SK))
+
+
+def test_TFE_operator_nested():
+    T = UFCInterval()
+    A, B, C = Lagrange(T, 1), Lagrange(T, 2), Lagrange(T, 1)
+    nested = [TensorProductElement(TensorProductElement(A, B), C),
+              FlattenedDimensions(TensorProductElement(FlattenedDimensions(TensorProductElement(A, B)), C))]
+    for elt in nested:
+        rule = create_quadrature(elt.get_reference_element(), 2)
+        with pytest.raises(ValueError) as excinfo:
+            TensorProductOperator(elt, rule)
+        assert "flat product" in str(excinfo.value)
+
+    # A flat product needs a rule with a factor per factor element
+    elt = TensorProductElement(A, B, C)
+    rule = create_quadrature(TensorProductElement(TensorProductElement(A, B), C).get_reference_element(), 2)
+    with pytest.raises(ValueError):
+        TensorProductOperator(elt, rule)
+
+
+def test_TFE_tabulate_tensor_grid():
+    A = RaviartThomas(UFCTriangle(), 2)
+    B = Lagrange(UFCInterval(), 3)
+    elt = TensorProductElement(A, B)
+    rule = create_quadrature(elt.get_reference_element(), 5)
+    npoints = [len(q.get_points()) for q in rule.factors]
+
+    calls = []
+    for e in (A, B):
+        def tabulate(order, points, entity=None, tabulate=e.tabulate):
+            calls.append(len(points))
+            return tabulate(order, points, entity)
+        e.tabulate = tabulate
+    tab = elt.tabulate(1, rule.get_points())
+    assert calls == npoints
+
+    # Distinct points are tabulated as before
+    points = np.random.RandomState(0).rand(6, 3) / 3
+    tab = elt.tabulate(1, np.concatenate([rule.get_points(), points]))
+    assert calls[2:] == [npoints[0] + 6, npoints[1] + 6]
+    expected = materialise(elt.tabulate_factored(1, rule))
+    for alpha, vals in tab.items():
+        assert np.allclose(vals[..., :-6], expected[alpha])
+
+
+def test_TFE_tabulate_distinct_points(monkeypatch):
+    elt = TensorProductElement(Lagrange(UFCTriangle(), 2), Lagrange(UFCInterval(), 1))
+    points = np.random.RandomState(0).rand(50, 3) / 3
+    expected = elt.tabulate(1, points)
+
+    # Scattered points are not sorted in search of repeats
+    def unique(*args, **kwargs):
+        raise AssertionError("Unexpected call to numpy.unique")
+    monkeypatch.setattr(np, "unique", unique)
+    tab = elt.tabulate(1, points)
+    for alpha, vals in tab.items():
+        assert np.array_equal(vals, expected[alpha])
+
+
+def test_TFE_tabulate_factored_hdiv():
+    elt = Hdiv(TensorProductElement(Lagrange(UFCInterval(), 1),
+                                    DiscontinuousLagrange(UFCInterval(), 0)))
+    with pytest.raises(NotImplementedError):
+        elt.tabulate_factored(0, create_quadrature(elt.get_reference_element(), 2))
+
+
 if __name__ == '__main__':
     import os
     pytest.main(os.path.abspath(__file__))